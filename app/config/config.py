@@ -1,5 +1,7 @@
 from pydantic_settings import BaseSettings
+from dotenv import dotenv_values
 import os
+from functools import lru_cache
 from typing import Optional
 
 class Settings(BaseSettings):
@@ -41,27 +43,24 @@ class Settings(BaseSettings):
         env_file_encoding = "utf-8"
         case_sensitive = False
 
-# 创建全局配置实例
+def _load_env_values() -> dict:
+    """读取.env文件和环境变量，返回Settings字段对应的值（环境变量优先）"""
+    merged = {**dotenv_values(".env", encoding="utf-8"), **os.environ}
+    return {key.lower(): value for key, value in merged.items()
+            if value is not None and key.lower() in Settings.model_fields}
+
+# .env只在导入时读取一次，之后重建Settings无需再访问文件
+_ENV_VALUES = _load_env_values()
+
+# 创建全局配置实例，只在首次调用时校验；
+# _env_file=None关闭BaseSettings自带的.env读取，值直接取自导入时读到的_ENV_VALUES
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
-    return Settings()
+    return Settings(_env_file=None, **_ENV_VALUES)
 
-# 默认配置
-default_settings = {
-    "outlook_folder": "收件箱",
-    "subject_keyword": "工单",
-    "output_directory": os.path.join(os.path.expanduser("~"), "outlook_tickets"),
-    "master_ip": "127.0.0.1",
-    "master_port": 8000,
-    "sync_interval": 300,
-    "app_mode": "standalone",
-    "image_quality": 85,
-    "max_image_size": 1024,
-    "web_host": "0.0.0.0",
-    "web_port": 8000,
-    "log_level": "INFO",
-    "log_file": None,
-    "ragflow_url": "http://localhost:9380",
-    "ragflow_api_key": "",
-    "ragflow_dataset_id": None,
-    "ragflow_upload_timeout": 300
-}
\ No newline at end of file
+# 默认配置，由Settings字段生成，避免两处定义不一致
+try:
+    default_settings = get_settings().model_dump()
+except Exception:
+    # .env或环境变量无效时，退回到字段声明中的默认值
+    default_settings = {name: field.default for name, field in Settings.model_fields.items()}
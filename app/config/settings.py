@@ -1,14 +1,103 @@
 import json
+import mmap
 import os
+import pickle
+import stat
+import tempfile
 import logging
 from app.config.config import default_settings, get_settings
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+try:
+    import orjson
+except ImportError:  # 未安装orjson时退回标准库json
+    orjson = None
+
 # 配置文件路径
 CONFIG_FILE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "..", "config.json")
 
+# 配置的二进制缓存文件，进程重启后免去重新解析JSON
+CONFIG_BINARY_CACHE_PATH = CONFIG_FILE_PATH + ".bin"
+
+# 已解析配置的缓存，以配置文件的(修改时间, 大小)作为失效依据
+_CONFIG_CACHE = {"key": None, "data": None}
+
+def _stat_key(st):
+    """由文件状态生成缓存键，修改时间或大小任一不同即视为配置已变化"""
+    return (st.st_mtime_ns, st.st_size)
+
+def _dumps_config(config_data):
+    """将配置序列化为UTF-8编码的JSON字节串"""
+    if orjson is not None:
+        return orjson.dumps(config_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(config_data, ensure_ascii=False, indent=2).encode("utf-8")
+
+def _loads_config(f):
+    """通过内存映射读取并解析配置文件"""
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if orjson is not None:
+            with memoryview(mm) as view:
+                return orjson.loads(view)
+        return json.loads(mm[:])
+
+def _write_atomic(path, payload):
+    """先写入临时文件并落盘，再原子地重命名，避免留下写了一半的文件
+    
+    临时文件名由mkstemp生成，多个服务进程同时写入时不会共用同一个临时文件；
+    返回写入文件的缓存键（重命名不改变修改时间和大小）
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            # mkstemp创建的文件权限为0600，沿用原文件的权限
+            try:
+                mode = stat.S_IMODE(os.stat(path).st_mode)
+            except FileNotFoundError:
+                mode = 0o644
+            os.chmod(tmp_path, mode)
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+            key = _stat_key(os.fstat(f.fileno()))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return key
+
+def _load_binary_cache(config_key):
+    """读取二进制缓存，缓存缺失或生成它的配置文件与当前文件不一致时返回None
+    
+    缓存内记录了源配置文件的(修改时间, 大小)，必须与当前值完全相同才使用，
+    因此恢复旧的配置文件（保留其修改时间）时也会重新解析
+    """
+    try:
+        with open(CONFIG_BINARY_CACHE_PATH, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                cached = pickle.loads(mm)
+        if cached.get("key") != config_key:
+            return None
+        return cached["data"]
+    except Exception:
+        return None
+
+def _save_binary_cache(config_key, config_data):
+    """写入二进制缓存，失败时只记录警告
+    
+    多个服务进程同时启动时都会错过缓存，其他进程已写入相同键的缓存时跳过写入
+    """
+    try:
+        if _load_binary_cache(config_key) is not None:
+            return
+        payload = pickle.dumps({"key": config_key, "data": config_data}, protocol=pickle.HIGHEST_PROTOCOL)
+        _write_atomic(CONFIG_BINARY_CACHE_PATH, payload)
+    except Exception as e:
+        logger.warning("写入配置缓存失败: %s", e)
+
 def save_config(config_data):
     """保存配置到文件"""
     try:
@@ -17,29 +106,46 @@ def save_config(config_data):
         if not os.path.exists(config_dir):
             os.makedirs(config_dir)
         
-        # 保存配置
-        with open(CONFIG_FILE_PATH, "w", encoding="utf-8") as f:
-            json.dump(config_data, f, ensure_ascii=False, indent=2)
+        # 保存配置，缓存键取自刚写入的文件本身，不受之后其他写入的影响
+        config_key = _write_atomic(CONFIG_FILE_PATH, _dumps_config(config_data))
+        _save_binary_cache(config_key, config_data)
+        
+        # 直接用刚写入的内容更新缓存，下次读取无需重新解析
+        _CONFIG_CACHE.update(key=config_key, data=dict(config_data))
+        get_settings.cache_clear()
         
-        logger.info(f"配置已保存到 {CONFIG_FILE_PATH}")
+        logger.info("配置已保存到 %s", CONFIG_FILE_PATH)
         return True
     except Exception as e:
-        logger.error(f"保存配置失败: {str(e)}")
+        logger.error("保存配置失败: %s", e)
         return False
 
 def load_config():
     """从文件加载配置"""
     try:
-        if os.path.exists(CONFIG_FILE_PATH):
-            with open(CONFIG_FILE_PATH, "r", encoding="utf-8") as f:
-                config_data = json.load(f)
-            logger.info(f"配置已从 {CONFIG_FILE_PATH} 加载")
-            return config_data
-        else:
-            logger.info(f"配置文件 {CONFIG_FILE_PATH} 不存在，使用默认配置")
+        try:
+            config_key = _stat_key(os.stat(CONFIG_FILE_PATH))
+        except FileNotFoundError:
+            logger.info("配置文件 %s 不存在，使用默认配置", CONFIG_FILE_PATH)
             return default_settings.copy()
+        
+        # 文件未修改时直接返回缓存，返回副本以免调用方修改缓存
+        cached_data = _CONFIG_CACHE["data"]
+        if cached_data is not None and _CONFIG_CACHE["key"] == config_key:
+            return cached_data.copy()
+        
+        config_data = _load_binary_cache(config_key)
+        if config_data is None:
+            with open(CONFIG_FILE_PATH, "rb") as f:
+                # 缓存键取自实际读取的文件，期间即使配置被替换也不会把旧内容记到新键下
+                config_key = _stat_key(os.fstat(f.fileno()))
+                config_data = _loads_config(f)
+            _save_binary_cache(config_key, config_data)
+        _CONFIG_CACHE.update(key=config_key, data=config_data)
+        logger.info("配置已从 %s 加载", CONFIG_FILE_PATH)
+        return config_data.copy()
     except Exception as e:
-        logger.error(f"加载配置失败: {str(e)}")
+        logger.error("加载配置失败: %s", e)
         return default_settings.copy()
 
 def update_config(config_data):
@@ -76,14 +182,14 @@ def init_config():
     output_dir = config.get("output_directory", default_settings["output_directory"])
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
-        logger.info(f"已创建输出目录: {output_dir}")
+        logger.info("已创建输出目录: %s", output_dir)
     
     # 确保日志目录存在
     if config.get("log_file"):
         log_dir = os.path.dirname(config["log_file"])
         if log_dir and not os.path.exists(log_dir):
             os.makedirs(log_dir)
-            logger.info(f"已创建日志目录: {log_dir}")
+            logger.info("已创建日志目录: %s", log_dir)
 
 # 合并默认配置和用户配置
 def merge_config(user_config):
@@ -93,6 +199,7 @@ def merge_config(user_config):
     return merged
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     # 测试配置功能
     print("测试配置功能...")
     
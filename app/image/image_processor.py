@@ -3,57 +3,128 @@ import cv2
 import numpy as np
 from PIL import Image, ImageOps
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from transformers import CLIPProcessor, CLIPModel
+from itertools import islice
+
+# torch和transformers导入耗时数秒、占用数百MB内存，只在真正加载CLIP模型时导入，
+# 这样图片压缩子进程（Windows上以spawn方式启动，会重新导入本模块）无需加载它们
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+try:
+    import pyvips
+except (ImportError, OSError):  # 未安装pyvips或缺少libvips时使用PIL
+    pyvips = None
+
+# 支持的图片格式
+IMAGE_EXTENSIONS = frozenset({".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff"})
+
+CLIP_MODEL_NAME = "openai/clip-vit-base-patch32"
+
+# CLIP的输入分辨率，大于该尺寸数倍的JPEG可以在解码时直接缩小
+CLIP_INPUT_SIZE = 224
+REDUCED_JPEG_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+def _compress_and_convert(image_path):
+    """压缩并转换单张图片，定义在模块级以便在子进程中执行"""
+    return ImageProcessor()._prepare_image(image_path)
+
 class ImageProcessor:
+    # CLIP模型在所有实例间共享，每个进程只加载一次
+    _shared_clip_model = None
+    _shared_clip_processor = None
+    
     def __init__(self):
-        self.clip_model = None
-        self.clip_processor = None
+        self.clip_model = ImageProcessor._shared_clip_model
+        self.clip_processor = ImageProcessor._shared_clip_processor
         
     def load_clip_model(self):
         """加载CLIP模型用于图片特征提取"""
+        if ImageProcessor._shared_clip_model is not None:
+            self.clip_model = ImageProcessor._shared_clip_model
+            self.clip_processor = ImageProcessor._shared_clip_processor
+            return True
+        
         try:
-            self.clip_model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-            self.clip_processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+            import torch
+            from transformers import CLIPProcessor, CLIPModel
+            
+            # GPU上使用半精度；CPU对半精度算子支持有限，保持单精度
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            dtype = torch.float16 if device == "cuda" else torch.float32
+            
+            try:
+                # 优先使用本地缓存的权重，避免每次启动都访问HuggingFace Hub
+                model = CLIPModel.from_pretrained(CLIP_MODEL_NAME, torch_dtype=dtype, local_files_only=True)
+                processor = CLIPProcessor.from_pretrained(CLIP_MODEL_NAME, local_files_only=True)
+            except OSError:
+                logger.info("本地没有CLIP模型缓存，从HuggingFace Hub下载")
+                model = CLIPModel.from_pretrained(CLIP_MODEL_NAME, torch_dtype=dtype)
+                processor = CLIPProcessor.from_pretrained(CLIP_MODEL_NAME)
+            
+            ImageProcessor._shared_clip_model = model.to(device).eval()
+            ImageProcessor._shared_clip_processor = processor
+            self.clip_model = ImageProcessor._shared_clip_model
+            self.clip_processor = ImageProcessor._shared_clip_processor
             logger.info("成功加载CLIP模型")
             return True
         except Exception as e:
-            logger.error(f"加载CLIP模型失败: {str(e)}")
+            logger.error("加载CLIP模型失败: %s", e)
             return False
     
-    def compress_image(self, input_path, output_path=None, quality=85, max_size=(1920, 1080)):
-        """压缩图片"""
+    def compress_image(self, input_path, output_path=None, quality=85, max_size=(1920, 1080), output_format=None):
+        """压缩图片，指定output_format时同时转换为该格式"""
         if not output_path:
             # 生成默认输出路径
             base_name, ext = os.path.splitext(input_path)
+            if output_format:
+                ext = f".{output_format.lower()}"
             output_path = f"{base_name}_compressed{ext}"
         
+        is_jpeg = os.path.splitext(output_path)[1].lower() in (".jpg", ".jpeg")
+        
         try:
-            with Image.open(input_path) as img:
-                # 转换为RGB模式（如果是RGBA）
-                if img.mode == 'RGBA':
-                    img = img.convert('RGB')
-                
-                # 调整大小
-                img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                
-                # 保存图片
-                img.save(output_path, optimize=True, quality=quality)
-                
-                original_size = os.path.getsize(input_path)
-                compressed_size = os.path.getsize(output_path)
-                compression_ratio = (1 - compressed_size / original_size) * 100
-                
-                logger.info(f"图片压缩完成: {input_path} → {output_path}")
-                logger.info(f"压缩率: {compression_ratio:.2f}% (原始: {original_size/1024:.2f}KB → 压缩后: {compressed_size/1024:.2f}KB)")
-                
-                return output_path
+            if pyvips is not None and is_jpeg:
+                # libvips按块流式解码和缩放，速度更快、内存占用更低
+                img = pyvips.Image.thumbnail(input_path, max_size[0], height=max_size[1], size="down")
+                if img.hasalpha():
+                    img = img.flatten(background=255)
+                img.jpegsave(output_path, Q=quality, optimize_coding=True, strip=True)
+            else:
+                with Image.open(input_path) as img:
+                    # 调整大小
+                    img.thumbnail(max_size, Image.Resampling.LANCZOS)
+                    
+                    if is_jpeg and (img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)):
+                        # 输出JPG时用白色背景处理透明区域
+                        img = img.convert('RGBA')
+                        background = Image.new('RGB', img.size, (255, 255, 255))
+                        background.paste(img, mask=img.split()[3])  # 使用alpha通道作为蒙版
+                        img = background
+                    elif is_jpeg and img.mode not in ('RGB', 'L'):
+                        img = img.convert('RGB')
+                    elif img.mode == 'RGBA':
+                        # 转换为RGB模式（如果是RGBA）
+                        img = img.convert('RGB')
+                    
+                    # 保存图片
+                    img.save(output_path, optimize=True, quality=quality)
+            
+            original_size = os.path.getsize(input_path)
+            compressed_size = os.path.getsize(output_path)
+            compression_ratio = (1 - compressed_size / original_size) * 100
+            
+            logger.info("图片压缩完成: %s → %s", input_path, output_path)
+            logger.info("压缩率: %.2f%% (原始: %.2fKB → 压缩后: %.2fKB)", compression_ratio, original_size/1024, compressed_size/1024)
+            
+            return output_path
         except Exception as e:
-            logger.error(f"压缩图片失败 {input_path}: {str(e)}")
+            logger.error("压缩图片失败 %s: %s", input_path, e)
             return None
     
     def convert_image_format(self, input_path, output_format='jpg'):
@@ -71,69 +142,159 @@ class ImageProcessor:
                 else:
                     img.save(output_path, quality=95)
                 
-                logger.info(f"图片格式转换完成: {input_path} → {output_path}")
+                logger.info("图片格式转换完成: %s → %s", input_path, output_path)
                 return output_path
         except Exception as e:
-            logger.error(f"转换图片格式失败 {input_path}: {str(e)}")
+            logger.error("转换图片格式失败 %s: %s", input_path, e)
             return None
     
+    def _load_image_for_clip(self, image_path):
+        """读取图片用于CLIP特征提取，大尺寸JPEG按倍数缩小解码"""
+        if os.path.splitext(image_path)[1].lower() in (".jpg", ".jpeg"):
+            with Image.open(image_path) as img:
+                min_side = min(img.size)  # 只解析文件头，不解码像素
+            
+            for factor, flag in REDUCED_JPEG_FLAGS:
+                if min_side // factor >= CLIP_INPUT_SIZE:
+                    # 使用imdecode而不是imread，以支持包含中文的路径
+                    bgr = cv2.imdecode(np.fromfile(image_path, dtype=np.uint8), flag)
+                    if bgr is not None:
+                        return Image.fromarray(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+                    break
+        
+        with Image.open(image_path) as img:
+            return img.convert("RGB")
+    
     def extract_image_features(self, image_path):
         """使用CLIP模型提取图片特征"""
         if not self.clip_model or not self.clip_processor:
             if not self.load_clip_model():
                 return None
         
+        import torch
+        
         try:
-            image = Image.open(image_path)
-            inputs = self.clip_processor(images=image, return_tensors="pt", padding=True)
-            outputs = self.clip_model.get_image_features(**inputs)
+            image = self._load_image_for_clip(image_path)
+            with torch.inference_mode():
+                inputs = self.clip_processor(images=image, return_tensors="pt")
+                pixel_values = inputs["pixel_values"].to(self.clip_model.device, dtype=self.clip_model.dtype)
+                outputs = self.clip_model.get_image_features(pixel_values=pixel_values)
             
             # 将特征转换为numpy数组
-            features = outputs.detach().numpy()[0]
+            features = outputs[0].float().cpu().numpy()
             
-            logger.info(f"成功提取图片特征: {image_path}")
+            logger.info("成功提取图片特征: %s", image_path)
             return features
         except Exception as e:
-            logger.error(f"提取图片特征失败 {image_path}: {str(e)}")
+            logger.error("提取图片特征失败 %s: %s", image_path, e)
             return None
     
-    def preprocess_image_for_vector_db(self, image_path, output_dir=None):
-        """预处理图片用于向量数据库"""
-        if not output_dir:
-            output_dir = os.path.dirname(image_path)
+    def extract_image_features_batch(self, image_paths, batch_size=32):
+        """使用CLIP模型批量提取图片特征，返回形状为(N, D)的数组，读取失败的图片对应行为NaN"""
+        if not self.clip_model or not self.clip_processor:
+            if not self.load_clip_model():
+                return None
         
-        # 1. 压缩图片
-        compressed_path = self.compress_image(image_path, max_size=(1024, 1024))
-        if not compressed_path:
-            return None
+        import torch
         
-        # 2. 转换为统一格式（JPG）
-        converted_path = self.convert_image_format(compressed_path, output_format='jpg')
-        if not converted_path:
-            converted_path = compressed_path  # 如果转换失败，使用压缩后的图片
+        features = np.full((len(image_paths), self.clip_model.config.projection_dim), np.nan, dtype=np.float32)
+        indexed_paths = iter(enumerate(image_paths))
         
-        # 3. 提取特征
-        features = self.extract_image_features(converted_path)
+        while True:
+            chunk = list(islice(indexed_paths, batch_size))
+            if not chunk:
+                break
+            
+            indices = []
+            images = []
+            for index, image_path in chunk:
+                try:
+                    images.append(self._load_image_for_clip(image_path))
+                    indices.append(index)
+                except Exception as e:
+                    logger.error("读取图片失败 %s: %s", image_path, e)
+            
+            if not images:
+                continue
+            
+            try:
+                # 每批只做一次前向计算
+                with torch.inference_mode():
+                    inputs = self.clip_processor(images=images, return_tensors="pt")
+                    pixel_values = inputs["pixel_values"].to(self.clip_model.device, dtype=self.clip_model.dtype)
+                    outputs = self.clip_model.get_image_features(pixel_values=pixel_values)
+                features[indices] = outputs.float().cpu().numpy()
+            except Exception as e:
+                logger.error("批量提取图片特征失败: %s", e)
         
-        # 4. 保存特征为npy文件
-        base_name, _ = os.path.splitext(converted_path)
+        logger.info("成功批量提取 %s 张图片的特征", len(image_paths))
+        return features
+    
+    def _prepare_image(self, image_path):
+        """压缩图片并输出为JPG，返回处理后的图片路径"""
+        # 压缩和格式转换一次完成，避免对JPEG重复解码和编码
+        return self.compress_image(image_path, max_size=(1024, 1024), output_format='jpg')
+    
+    def _build_result(self, image_path, processed_path, features):
+        """保存特征为npy文件并生成处理结果"""
+        base_name, _ = os.path.splitext(processed_path)
         features_path = f"{base_name}_features.npy"
         if features is not None:
+            # CLIP特征以半精度保存，文件和内存占用减半
+            features = features.astype(np.float16)
             np.save(features_path, features)
-            logger.info(f"图片特征已保存: {features_path}")
-        
-        # 5. 清理临时文件
-        if compressed_path != converted_path and os.path.exists(compressed_path):
-            os.remove(compressed_path)
+            logger.info("图片特征已保存: %s", features_path)
         
-        result = {
+        return {
             "original_path": image_path,
-            "processed_path": converted_path,
+            "processed_path": processed_path,
             "features_path": features_path if features is not None else None,
-            "features": features.tolist() if features is not None else None
+            "features": features
         }
+    
+    def load_image_features(self, features_path):
+        """以内存映射方式只读加载保存的图片特征"""
+        try:
+            return np.load(features_path, mmap_mode='r')
+        except Exception as e:
+            logger.error("加载图片特征失败 %s: %s", features_path, e)
+            return None
+    
+    def _process_images(self, image_paths):
+        """在多个进程中并行预处理图片，再在当前进程中批量提取特征"""
+        if len(image_paths) > 1:
+            with ProcessPoolExecutor(max_workers=min(len(image_paths), os.cpu_count() or 1)) as executor:
+                processed_paths = list(executor.map(_compress_and_convert, image_paths))
+        else:
+            processed_paths = [self._prepare_image(image_path) for image_path in image_paths]
+        
+        prepared = [(image_path, processed_path)
+                    for image_path, processed_path in zip(image_paths, processed_paths) if processed_path]
+        if not prepared:
+            return []
         
-        return result
+        features = self.extract_image_features_batch([processed_path for _, processed_path in prepared])
+        
+        results = []
+        for index, (image_path, processed_path) in enumerate(prepared):
+            image_features = features[index] if features is not None else None
+            if image_features is not None and np.isnan(image_features).any():
+                image_features = None
+            results.append(self._build_result(image_path, processed_path, image_features))
+        
+        return results
+    
+    def preprocess_image_for_vector_db(self, image_path, output_dir=None):
+        """预处理图片用于向量数据库"""
+        if not output_dir:
+            output_dir = os.path.dirname(image_path)
+        
+        processed_path = self._prepare_image(image_path)
+        if not processed_path:
+            return None
+        
+        features = self.extract_image_features(processed_path)
+        return self._build_result(image_path, processed_path, features)
     
     def process_images_in_directory(self, input_dir, output_dir=None):
         """处理目录中的所有图片"""
@@ -143,23 +304,12 @@ class ImageProcessor:
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
         
-        # 支持的图片格式
-        image_extensions = [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff"]
-        
-        processed_results = []
-        
-        for filename in os.listdir(input_dir):
-            file_path = os.path.join(input_dir, filename)
-            if os.path.isfile(file_path) and os.path.splitext(filename)[1].lower() in image_extensions:
-                # 复制文件到输出目录
-                output_path = os.path.join(output_dir, filename)
-                
-                # 预处理图片
-                result = self.preprocess_image_for_vector_db(file_path, output_dir)
-                if result:
-                    processed_results.append(result)
+        # scandir返回的DirEntry自带文件类型信息，无需逐个stat
+        with os.scandir(input_dir) as entries:
+            image_paths = [entry.path for entry in entries
+                           if entry.name[entry.name.rfind("."):].lower() in IMAGE_EXTENSIONS and entry.is_file()]
         
-        return processed_results
+        return self._process_images(image_paths)
     
     def get_image_metadata(self, image_path):
         """获取图片元数据"""
@@ -178,7 +328,7 @@ class ImageProcessor:
                 }
                 return metadata
         except Exception as e:
-            logger.error(f"获取图片元数据失败 {image_path}: {str(e)}")
+            logger.error("获取图片元数据失败 %s: %s", image_path, e)
             return None
     
     def batch_process_images(self, image_paths, output_dir):
@@ -186,16 +336,11 @@ class ImageProcessor:
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
         
-        results = []
-        for image_path in image_paths:
-            if os.path.exists(image_path):
-                result = self.preprocess_image_for_vector_db(image_path, output_dir)
-                if result:
-                    results.append(result)
-        
-        return results
+        existing_paths = [image_path for image_path in image_paths if os.path.exists(image_path)]
+        return self._process_images(existing_paths)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     # 测试代码
     processor = ImageProcessor()
     
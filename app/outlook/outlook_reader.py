@@ -1,36 +1,59 @@
+import pythoncom
 import win32com.client
 import os
+import asyncio
 from datetime import datetime
 import logging
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 进程内所有Outlook访问共用的锁：Outlook COM为单线程单元，并发连接会相互阻塞。
+# 调用方在事件循环中持有该锁，再把连接、读取、断开整体交给工作线程，
+# 排队等待的请求不会占用线程池中的线程
+OUTLOOK_LOCK = asyncio.Lock()
+
+def _safe_getattr(obj, attr, default=""):
+    """读取COM对象属性，属性不存在或读取失败时返回默认值"""
+    try:
+        return getattr(obj, attr)
+    except Exception:
+        return default
+
 class OutlookReader:
     def __init__(self):
         self.outlook = None
         self.namespace = None
         self.inbox = None
+        self._com_initialized = False
     
     def connect(self):
-        """连接到Outlook应用程序，添加容错处理"""
+        """连接到Outlook应用程序，添加容错处理
+        
+        COM对象只能在创建它的线程中使用，因此每个调用线程都先初始化COM；
+        在工作线程中使用时，连接、读取和断开都必须在同一线程内完成
+        """
+        if not self._com_initialized:
+            pythoncom.CoInitialize()
+            self._com_initialized = True
+        
         try:
-            # 先尝试获取正在运行的Outlook实例
+            # 使用早期绑定的类型缓存，属性按DISPID直接调用，省去每次的名称查找；
+            # Outlook为单实例应用，已运行时会直接连接到该实例，否则启动它
             try:
-                self.outlook = win32com.client.GetActiveObject("Outlook.Application")
-                logger.info("成功连接到已运行的Outlook实例")
-            except Exception:
-                # 如果Outlook未运行，尝试启动它
-                logger.info("Outlook未运行，尝试启动...")
+                self.outlook = win32com.client.gencache.EnsureDispatch("Outlook.Application")
+                logger.info("成功连接到Outlook（早期绑定）")
+            except Exception as e:
+                # 类型缓存无法生成时退回到后期绑定
+                logger.info("生成Outlook类型缓存失败，使用后期绑定: %s", e)
                 self.outlook = win32com.client.Dispatch("Outlook.Application")
-                logger.info("成功启动并连接到Outlook")
+                logger.info("成功连接到Outlook")
             
             self.namespace = self.outlook.GetNamespace("MAPI")
             self.inbox = self.namespace.GetDefaultFolder(6)  # 6 表示收件箱
             logger.info("成功连接到Outlook收件箱")
             return True
         except Exception as e:
-            logger.warning(f"无法连接到Outlook: {str(e)}")
+            logger.warning("无法连接到Outlook: %s", e)
             logger.info("Outlook未启动或不可用，程序将继续运行")
             return False
     
@@ -43,39 +66,38 @@ class OutlookReader:
         
         try:
             target_folder = folder if folder else self.inbox
-            messages = target_folder.Items
-            messages.Sort("ReceivedTime", True)  # 按接收时间降序排序
             
-            filtered_emails = []
-            for message in messages:
-                try:
-                    if subject_keyword in message.Subject:
-                        filtered_emails.append(message)
-                        logger.info(f"找到邮件: {message.Subject}")
-                except Exception as e:
-                    logger.warning(f"处理邮件时出错: {str(e)}")
-                    continue
+            # 由Outlook在MAPI存储内完成主题过滤，只有匹配的邮件才会跨越COM边界
+            keyword = subject_keyword.replace("'", "''")
+            filter_str = f"@SQL=\"urn:schemas:httpmail:subject\" LIKE '%{keyword}%'"
+            messages = target_folder.Items.Restrict(filter_str)
+            messages.Sort("ReceivedTime", True)  # 按接收时间降序排序
             
+            filtered_emails = list(messages)
+            logger.info("找到 %s 封主题包含 %s 的邮件", len(filtered_emails), subject_keyword)
             return filtered_emails
         except Exception as e:
-            logger.warning(f"获取邮件列表失败: {str(e)}")
+            logger.warning("获取邮件列表失败: %s", e)
             return []
     
     def get_email_details(self, message):
         """获取邮件详细信息，添加容错处理"""
         try:
+            # 每个属性直接读取一次，不再先用hasattr探测（每次探测都是一次COM调用）
+            received_time = _safe_getattr(message, 'ReceivedTime', None)
+            attachments = _safe_getattr(message, 'Attachments', None)
             email_details = {
-                "subject": message.Subject if hasattr(message, 'Subject') else "",
-                "sender": message.SenderEmailAddress if hasattr(message, 'SenderEmailAddress') else "",
-                "sender_name": message.SenderName if hasattr(message, 'SenderName') else "",
-                "received_time": message.ReceivedTime.strftime("%Y-%m-%d %H:%M:%S") if hasattr(message, 'ReceivedTime') else "",
-                "body": message.Body if hasattr(message, 'Body') else "",
-                "html_body": message.HTMLBody if hasattr(message, 'HTMLBody') else "",
-                "attachments_count": message.Attachments.Count if hasattr(message, 'Attachments') else 0
+                "subject": _safe_getattr(message, 'Subject'),
+                "sender": _safe_getattr(message, 'SenderEmailAddress'),
+                "sender_name": _safe_getattr(message, 'SenderName'),
+                "received_time": received_time.strftime("%Y-%m-%d %H:%M:%S") if received_time is not None else "",
+                "body": _safe_getattr(message, 'Body'),
+                "html_body": _safe_getattr(message, 'HTMLBody'),
+                "attachments_count": attachments.Count if attachments is not None else 0
             }
             return email_details
         except Exception as e:
-            logger.warning(f"获取邮件详细信息失败: {str(e)}")
+            logger.warning("获取邮件详细信息失败: %s", e)
             return {
                 "subject": "",
                 "sender": "",
@@ -89,36 +111,36 @@ class OutlookReader:
     def save_attachments(self, message, save_folder):
         """保存邮件附件，添加容错处理"""
         try:
-            if not os.path.exists(save_folder):
-                os.makedirs(save_folder)
+            os.makedirs(save_folder, exist_ok=True)
             
             saved_files = []
-            if not hasattr(message, 'Attachments'):
+            attachments = getattr(message, 'Attachments', None)
+            if attachments is None:
                 logger.info("邮件没有附件")
                 return saved_files
             
-            for attachment in message.Attachments:
+            # 生成唯一的文件名前缀，避免重名；同一封邮件的附件共用一个时间戳
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            for attachment in attachments:
+                file_name = None
                 try:
-                    if not hasattr(attachment, 'FileName'):
+                    # 每个COM属性只读取一次
+                    file_name = getattr(attachment, 'FileName', None)
+                    if file_name is None:
                         logger.warning("找到无效附件")
                         continue
                     
-                    # 生成唯一的文件名，避免重名
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    file_extension = os.path.splitext(attachment.FileName)[1]
-                    filename = f"{timestamp}_{attachment.FileName}"
-                    file_path = os.path.join(save_folder, filename)
-                    
+                    file_path = os.path.join(save_folder, f"{timestamp}_{file_name}")
                     attachment.SaveAsFile(file_path)
                     saved_files.append(file_path)
-                    logger.info(f"保存附件: {file_path}")
+                    logger.info("保存附件: %s", file_path)
                 except Exception as e:
-                    logger.warning(f"保存附件失败 {getattr(attachment, 'FileName', '未知文件')}: {str(e)}")
+                    logger.warning("保存附件失败 %s: %s", file_name or '未知文件', e)
                     continue
             
             return saved_files
         except Exception as e:
-            logger.warning(f"处理附件时出错: {str(e)}")
+            logger.warning("处理附件时出错: %s", e)
             return []
     
     def get_all_folders(self):
@@ -129,16 +151,18 @@ class OutlookReader:
                 return []
         
         try:
-            def list_folders(folder, level=0):
-                folders = []
+            # 使用显式栈做深度优先遍历，避免深层文件夹触发递归上限
+            folders = []
+            stack = [(self.namespace.GetDefaultFolder(6), 0)]  # 从收件箱开始
+            while stack:
+                folder, level = stack.pop()
                 folders.append(("  " * level + folder.Name, folder))
-                for subfolder in folder.Folders:
-                    folders.extend(list_folders(subfolder, level + 1))
-                return folders
+                # 逆序入栈，保持子文件夹原有的显示顺序
+                stack.extend((subfolder, level + 1) for subfolder in reversed(list(folder.Folders)))
             
-            return list_folders(self.namespace.GetDefaultFolder(6))  # 从收件箱开始
+            return folders
         except Exception as e:
-            logger.warning(f"获取文件夹列表失败: {str(e)}")
+            logger.warning("获取文件夹列表失败: %s", e)
             return []
     
     def get_folder_by_name(self, folder_path):
@@ -155,7 +179,7 @@ class OutlookReader:
                     folder = folder.Folders(folder_name)
             return folder
         except Exception as e:
-            logger.warning(f"获取文件夹失败 {folder_path}: {str(e)}")
+            logger.warning("获取文件夹失败 %s: %s", folder_path, e)
             return None
     
     def disconnect(self):
@@ -167,9 +191,15 @@ class OutlookReader:
                 self.inbox = None
                 logger.info("已断开与Outlook的连接")
             except Exception as e:
-                logger.error(f"断开连接失败: {str(e)}")
+                logger.error("断开连接失败: %s", e)
+        
+        # 释放COM对象后再反初始化，与connect中的CoInitialize配对
+        if self._com_initialized:
+            pythoncom.CoUninitialize()
+            self._com_initialized = False
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     # 测试代码
     reader = OutlookReader()
     if reader.connect():
@@ -1,36 +1,167 @@
 import re
 import os
 import json
+import shutil
 import logging
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from html.parser import HTMLParser
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-class EmailParser:
+try:
+    from selectolax.parser import HTMLParser as SelectolaxHTMLParser
+except ImportError:  # 未安装selectolax时使用标准库html.parser
+    SelectolaxHTMLParser = None
+
+# 工单字段标签与字段名的对应关系
+TICKET_FIELDS = {
+    "工单编号": "ticket_id",
+    "客户名称": "customer_name",
+    "联系方式": "contact_info",
+    "问题描述": "problem_desc",
+    "优先级": "priority",
+    "状态": "status",
+    "指派给": "assigned_to",
+    "创建时间": "created_time"
+}
+
+# 可以跨多行的字段，其值一直延续到下一个字段标签为止
+MULTILINE_FIELDS = frozenset({"problem_desc"})
+
+# 所有字段标签合并为一个正则，finditer一次扫描即可定位全部字段
+TICKET_FIELD_RE = re.compile(
+    r"^[^\S\n]*(?P<label>" + "|".join(map(re.escape, TICKET_FIELDS)) + r")[^\S\n]*[:：](?P<value>[^\n]*)",
+    re.MULTILINE
+)
+
+# 工单编号会直接用作目录名，只取开头由字母、数字、下划线和连字符组成的部分，
+# 避免../或Windows目录名中的非法字符
+TICKET_ID_RE = re.compile(r"[\w-]+")
+
+# 支持的图片格式（元组可直接用于str.endswith）
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff")
+
+# 批量移动附件时的最大线程数
+RENAME_WORKERS = 8
+
+# 批量解析邮件时的最大线程数（正则匹配与文件写入交替进行）
+PARSE_WORKERS = min(32, (os.cpu_count() or 4) * 2)
+
+def _unique_targets(paths, target_dir):
+    """为每个源文件在target_dir中选出不冲突的目标路径，返回(源路径, 目标路径)列表
+    
+    目标已存在或与同批其他附件重名时在文件名后追加_1、_2等序号，避免覆盖；
+    源文件本身已在target_dir中时保留原路径
+    """
+    pairs = []
+    taken = set()
+    for src in paths:
+        name, ext = os.path.splitext(os.path.basename(src))
+        dst = os.path.join(target_dir, name + ext)
+        suffix = 0
+        while (os.path.normcase(dst) in taken
+               or (os.path.exists(dst) and not _same_path(src, dst))):
+            suffix += 1
+            dst = os.path.join(target_dir, f"{name}_{suffix}{ext}")
+        taken.add(os.path.normcase(dst))
+        pairs.append((src, dst))
+    return pairs
+
+def _same_path(a, b):
+    """判断两个路径是否指向同一位置"""
+    return os.path.normcase(os.path.realpath(a)) == os.path.normcase(os.path.realpath(b))
+
+def _move_file(pair):
+    """移动单个文件，目标已存在时不覆盖，返回是否成功"""
+    src, dst = pair
+    try:
+        if _same_path(src, dst):
+            return True
+        if os.path.exists(dst):
+            raise FileExistsError(f"目标文件已存在: {dst}")
+        try:
+            # 同一文件系统内rename是原子的（不用os.replace，Windows上目标已存在时会报错而不是覆盖）
+            os.rename(src, dst)
+        except FileExistsError:
+            raise
+        except OSError:
+            # 跨设备(EXDEV)等情况退回到复制后删除
+            shutil.move(src, dst)
+        logger.info("移动附件: %s → %s", src, dst)
+        return True
+    except Exception as e:
+        logger.error("移动附件失败 %s: %s", src, e)
+        return False
+
+def _batch_rename(pairs):
+    """批量移动文件，返回与pairs一一对应的成功标记
+    
+    每次rename都是一次阻塞的系统调用，附件较多或位于网络盘时用线程池并发提交
+    """
+    if len(pairs) <= 1:
+        return [_move_file(pair) for pair in pairs]
+    with ThreadPoolExecutor(max_workers=min(RENAME_WORKERS, len(pairs))) as executor:
+        return list(executor.map(_move_file, pairs))
+
+class _HTMLTextExtractor(HTMLParser):
+    """流式收集HTML中的文本，跳过script和style的内容
+    
+    只在块级标签处插入分隔空格，行内标签（如b、span）两侧的文本直接相连
+    """
+    SKIP_TAGS = frozenset({"script", "style"})
+    BLOCK_TAGS = frozenset({
+        "p", "br", "div", "tr", "td", "th", "li", "ul", "ol", "table",
+        "h1", "h2", "h3", "h4", "h5", "h6", "hr", "blockquote", "pre",
+    })
+    
     def __init__(self):
-        # 预定义的工单字段正则表达式
-        self.patterns = {
-            "ticket_id": r"工单编号[:：]\s*(\w+)\s*",
-            "customer_name": r"客户名称[:：]\s*(.+)\s*",
-            "contact_info": r"联系方式[:：]\s*(.+)\s*",
-            "problem_desc": r"问题描述[:：]\s*(.+?)(?=\n\S+:|$)",
-            "priority": r"优先级[:：]\s*(.+?)\s*",
-            "status": r"状态[:：]\s*(.+?)\s*",
-            "assigned_to": r"指派给[:：]\s*(.+?)\s*",
-            "created_time": r"创建时间[:：]\s*([\d-]+\s+[\d:]+)\s*"
-        }
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip_depth = 0
+    
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append(" ")
+    
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            if self._skip_depth:
+                self._skip_depth -= 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append(" ")
     
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+class EmailParser:
     def extract_ticket_info(self, email_body):
         """从邮件内容中提取工单信息"""
-        ticket_info = {}
+        ticket_info = dict.fromkeys(TICKET_FIELDS.values(), "")
+        seen_fields = set()
         
-        for field, pattern in self.patterns.items():
-            match = re.search(pattern, email_body, re.DOTALL | re.IGNORECASE)
-            if match:
-                ticket_info[field] = match.group(1).strip()
+        matches = list(TICKET_FIELD_RE.finditer(email_body))
+        for index, match in enumerate(matches):
+            field = TICKET_FIELDS[match.group("label")]
+            # 同一字段出现多次时只保留第一次的值
+            if field in seen_fields:
+                continue
+            seen_fields.add(field)
+            
+            if field in MULTILINE_FIELDS:
+                end = matches[index + 1].start() if index + 1 < len(matches) else len(email_body)
+                value = email_body[match.start("value"):end]
             else:
-                ticket_info[field] = ""
+                value = match.group("value")
+            value = value.strip()
+            if field == "ticket_id":
+                id_match = TICKET_ID_RE.match(value)
+                value = id_match.group() if id_match else ""
+            ticket_info[field] = value
         
         # 如果没有找到工单编号，生成一个临时的
         if not ticket_info["ticket_id"]:
@@ -45,108 +176,155 @@ class EmailParser:
         parsed_data = {
             "email": email_details,
             "ticket": ticket_info,
-            "attachments": attachments or [],
+            "attachments": [],
             "parsed_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "has_images": any(self._is_image_file(file) for file in attachments or [])
+            "has_images": False
         }
         
+        # 没有附件时无需再判断图片
+        if not attachments:
+            return parsed_data
+        
+        parsed_data["attachments"] = attachments
+        parsed_data["has_images"] = any(self._is_image_file(file) for file in attachments)
         return parsed_data
     
     def _is_image_file(self, file_path):
         """判断文件是否为图片"""
-        image_extensions = [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff"]
-        return os.path.splitext(file_path)[1].lower() in image_extensions
+        return file_path.lower().endswith(IMAGE_EXTENSIONS)
     
-    def save_to_file(self, parsed_data, output_dir):
-        """将解析后的数据保存到文件"""
-        ticket_id = parsed_data["ticket"]["ticket_id"]
+    def _get_ticket_dir(self, ticket_id, output_dir):
+        """返回工单目录，工单编号不是合法目录名或解析后不在输出目录内时抛出ValueError"""
+        if not TICKET_ID_RE.fullmatch(ticket_id or ""):
+            raise ValueError(f"非法的工单编号: {ticket_id!r}")
         
-        # 创建工单目录
         ticket_dir = os.path.join(output_dir, ticket_id)
-        if not os.path.exists(ticket_dir):
-            os.makedirs(ticket_dir)
+        output_root = os.path.realpath(output_dir)
+        if os.path.dirname(os.path.realpath(ticket_dir)) != output_root:
+            raise ValueError(f"工单目录不在输出目录内: {ticket_dir}")
+        return ticket_dir
+    
+    def save_to_file(self, parsed_data, output_dir, save_body_files=True):
+        """将解析后的数据保存到文件
+        
+        email_data.json是权威记录，已包含正文和HTML；save_body_files为False时
+        不再额外写出email_body.txt/email_body.html
+        """
+        ticket_dir = self._get_ticket_dir(parsed_data["ticket"]["ticket_id"], output_dir)
         
-        # 创建附件目录
+        # 创建工单目录和附件目录（exist_ok避免先检查再创建的竞争）
         attachments_dir = os.path.join(ticket_dir, "attachments")
-        if not os.path.exists(attachments_dir):
-            os.makedirs(attachments_dir)
+        os.makedirs(attachments_dir, exist_ok=True)
         
         # 移动附件到工单目录并更新附件路径
         saved_attachments = []
         if parsed_data["attachments"]:
-            for attachment_path in parsed_data["attachments"]:
-                try:
-                    filename = os.path.basename(attachment_path)
-                    new_path = os.path.join(attachments_dir, filename)
-                    os.rename(attachment_path, new_path)
-                    logger.info(f"移动附件: {attachment_path} → {new_path}")
-                    
-                    # 保存相对路径以便在HTML中使用
-                    relative_path = os.path.relpath(new_path, output_dir)
-                    saved_attachments.append({
-                        "original_path": attachment_path,
-                        "saved_path": new_path,
-                        "relative_path": relative_path,
-                        "is_image": self._is_image_file(new_path)
-                    })
-                except Exception as e:
-                    logger.error(f"移动附件失败 {attachment_path}: {str(e)}")
+            # 目标文件名先在本线程中依次确定，再并发移动
+            pairs = _unique_targets(parsed_data["attachments"], attachments_dir)
+            for (attachment_path, new_path), moved in zip(pairs, _batch_rename(pairs)):
+                if not moved:
+                    continue
+                # 保存相对路径以便在HTML中使用
+                relative_path = os.path.relpath(new_path, output_dir)
+                saved_attachments.append({
+                    "original_path": attachment_path,
+                    "saved_path": new_path,
+                    "relative_path": relative_path,
+                    "is_image": self._is_image_file(new_path)
+                })
         
         # 更新解析数据中的附件信息
         parsed_data["attachments"] = saved_attachments
         
-        # 保存邮件内容为JSON
+        # 保存邮件内容为JSON，orjson一次序列化为UTF-8字节后整体写入
         email_json_path = os.path.join(ticket_dir, "email_data.json")
-        with open(email_json_path, "w", encoding="utf-8") as f:
-            json.dump(parsed_data, f, ensure_ascii=False, indent=2)
-        
-        # 保存邮件正文为文本文件
-        email_body_path = os.path.join(ticket_dir, "email_body.txt")
-        with open(email_body_path, "w", encoding="utf-8") as f:
-            f.write(parsed_data["email"]["body"])
+        with open(email_json_path, "wb") as f:
+            f.write(orjson.dumps(parsed_data, option=orjson.OPT_INDENT_2))
         
-        # 如果有HTML内容，也保存
-        if parsed_data["email"]["html_body"]:
-            email_html_path = os.path.join(ticket_dir, "email_body.html")
-            with open(email_html_path, "w", encoding="utf-8") as f:
-                f.write(parsed_data["email"]["html_body"])
+        if save_body_files:
+            # 保存邮件正文为文本文件
+            email_body_path = os.path.join(ticket_dir, "email_body.txt")
+            with open(email_body_path, "wb") as f:
+                f.write(parsed_data["email"]["body"].encode("utf-8"))
+            
+            # 如果有HTML内容，也保存
+            if parsed_data["email"]["html_body"]:
+                email_html_path = os.path.join(ticket_dir, "email_body.html")
+                with open(email_html_path, "wb") as f:
+                    f.write(parsed_data["email"]["html_body"].encode("utf-8"))
         
         # 保存附件列表
         attachments_list_path = os.path.join(ticket_dir, "attachments.json")
-        with open(attachments_list_path, "w", encoding="utf-8") as f:
-            json.dump(saved_attachments, f, ensure_ascii=False, indent=2)
+        with open(attachments_list_path, "wb") as f:
+            f.write(orjson.dumps(saved_attachments, option=orjson.OPT_INDENT_2))
         
-        logger.info(f"工单数据已保存到: {ticket_dir}")
+        logger.info("工单数据已保存到: %s", ticket_dir)
         return ticket_dir
     
     def batch_parse_emails(self, emails, output_dir, subject_keyword="工单"):
-        """批量解析邮件"""
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+        """批量解析邮件
         
-        parsed_results = []
-        for email in emails:
+        同一工单编号的邮件写入同一目录，因此按工单分组：组内按输入顺序依次保存，
+        不同工单的组用线程池并发保存，结果顺序与输入一致
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        
+        # 先解析全部邮件（只做正则匹配，开销很小），按工单目录分组；
+        # normcase使Windows上仅大小写不同的编号归入同一组
+        groups = {}
+        for index, email in enumerate(emails):
+            parsed_data = self._parse_one(email)
+            if parsed_data is not None:
+                group_key = os.path.normcase(parsed_data["ticket"]["ticket_id"])
+                groups.setdefault(group_key, []).append((index, parsed_data))
+        
+        if len(groups) <= 1:
+            saved_groups = [self._save_group(group, output_dir) for group in groups.values()]
+        else:
+            with ThreadPoolExecutor(max_workers=min(PARSE_WORKERS, len(groups))) as executor:
+                saved_groups = list(executor.map(lambda group: self._save_group(group, output_dir), groups.values()))
+        
+        saved = dict(item for saved_group in saved_groups for item in saved_group)
+        return [saved[index] for index in sorted(saved)]
+    
+    def _parse_one(self, email):
+        """解析单封邮件，失败时返回None"""
+        try:
+            return self.parse_email(email)
+        except Exception as e:
+            logger.error("解析邮件失败: %s", e)
+            return None
+    
+    def _save_group(self, group, output_dir):
+        """依次保存同一工单的邮件，返回成功保存的(序号, 结果)列表"""
+        saved = []
+        for index, parsed_data in group:
             try:
-                parsed_data = self.parse_email(email)
                 saved_path = self.save_to_file(parsed_data, output_dir)
-                parsed_results.append({
+                saved.append((index, {
                     "ticket_id": parsed_data["ticket"]["ticket_id"],
                     "subject": parsed_data["email"]["subject"],
                     "saved_path": saved_path
-                })
+                }))
             except Exception as e:
-                logger.error(f"解析邮件失败: {str(e)}")
-                continue
-        
-        return parsed_results
+                logger.error("保存邮件失败: %s", e)
+        return saved
     
     def extract_text_from_html(self, html_content):
         """从HTML内容中提取纯文本"""
-        # 简单的HTML标签移除
-        text = re.sub(r'<[^>]+>', '', html_content)
+        # 用HTML解析器一次遍历取出文本，同时正确处理实体和script/style
+        if SelectolaxHTMLParser is not None:
+            tree = SelectolaxHTMLParser(html_content)
+            tree.strip_tags(["script", "style"])
+            text = tree.text(separator=" ")
+        else:
+            extractor = _HTMLTextExtractor()
+            extractor.feed(html_content)
+            extractor.close()
+            text = "".join(extractor.parts)
+        
         # 移除多余的空白字符
-        text = re.sub(r'\s+', ' ', text).strip()
-        return text
+        return " ".join(text.split())
     
     def get_ticket_summary(self, parsed_data):
         """生成工单摘要"""
@@ -168,6 +346,7 @@ class EmailParser:
         return summary.strip()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     # 测试代码
     parser = EmailParser()
     
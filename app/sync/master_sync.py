@@ -2,105 +2,124 @@ import asyncio
 import aiohttp
 import logging
 import os
+import re
 import json
-from datetime import datetime
-from typing import List, Dict, Optional
+import orjson
+from datetime import datetime, timedelta
+from types import MappingProxyType
+from typing import Dict, Optional, Mapping, Tuple
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 同步数据文件名格式: sync_<slave_id>_<YYYYMMDD>_<HHMMSS>.json（slave_id本身可能包含下划线）
+SYNC_FILE_RE = re.compile(r"^sync_(?P<slave>.+)_(?P<date>\d{8})_\d{6}\.json$")
+
 class MasterSync:
     def __init__(self, data_directory: str):
         self.data_directory = data_directory
         self.synced_data: Dict[str, Dict] = {}
-        self.slaves: List[str] = []
+        # 只读视图随synced_data实时更新，状态接口无需每次复制
+        self._synced_view = MappingProxyType(self.synced_data)
+        # 用dict的键作为有序集合：O(1)成员判断，同时保留从应用首次同步的顺序
+        self.slaves: Dict[str, None] = {}
         
         # 确保数据目录存在
         if not os.path.exists(self.data_directory):
             os.makedirs(self.data_directory)
     
-    async def handle_slave_sync(self, slave_id: str, data: Dict):
-        """处理从应用的同步请求"""
+    async def handle_slave_sync(self, slave_id: str, data: Dict, pretty: bool = False):
+        """处理从应用的同步请求
+        
+        同步文件只供程序读取，默认写紧凑JSON；pretty为True时缩进输出，便于调试
+        """
         try:
-            logger.info(f"接收来自从应用 {slave_id} 的同步数据")
+            logger.info("接收来自从应用 %s 的同步数据", slave_id)
             
             # 保存同步数据
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             data_file = os.path.join(self.data_directory, f"sync_{slave_id}_{timestamp}.json")
             
-            with open(data_file, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            # 只序列化一次，文件写入放到线程池中执行，避免阻塞事件循环
+            payload = orjson.dumps(data, option=orjson.OPT_INDENT_2 if pretty else None)
+            await asyncio.to_thread(self._write_file, data_file, payload)
             
             # 更新内存中的数据
             self.synced_data[slave_id] = {
                 "last_sync": timestamp,
                 "data": data,
-                "file_path": data_file
+                "file_path": data_file,
+                "size": len(payload)
             }
             
             # 记录从应用
-            if slave_id not in self.slaves:
-                self.slaves.append(slave_id)
+            self.slaves[slave_id] = None
             
-            logger.info(f"成功保存从应用 {slave_id} 的同步数据")
+            logger.info("成功保存从应用 %s 的同步数据", slave_id)
             
             # 返回确认信息
             return {
                 "status": "success",
                 "message": "同步成功",
                 "timestamp": timestamp,
-                "received_data_size": len(json.dumps(data))
+                "received_data_size": len(payload)
             }
         except Exception as e:
-            logger.error(f"处理从应用 {slave_id} 的同步数据失败: {str(e)}")
+            logger.error("处理从应用 %s 的同步数据失败: %s", slave_id, e)
             return {
                 "status": "error",
                 "message": f"同步失败: {str(e)}"
             }
     
-    def get_synced_slaves(self) -> List[str]:
+    @staticmethod
+    def _write_file(file_path: str, payload: bytes):
+        """将序列化后的数据写入文件"""
+        with open(file_path, "wb") as f:
+            f.write(payload)
+    
+    def get_synced_slaves(self) -> Tuple[str, ...]:
         """获取已同步的从应用列表"""
-        return self.slaves.copy()
+        return tuple(self.slaves)
     
     def get_slave_data(self, slave_id: str) -> Optional[Dict]:
         """获取特定从应用的同步数据"""
         return self.synced_data.get(slave_id)
     
-    def get_all_synced_data(self) -> Dict[str, Dict]:
-        """获取所有从应用的同步数据"""
-        return self.synced_data.copy()
+    def get_all_synced_data(self) -> Mapping[str, Dict]:
+        """获取所有从应用的同步数据（只读视图）"""
+        return self._synced_view
     
     def clean_old_data(self, days: int = 7):
         """清理指定天数前的旧数据"""
         try:
-            import shutil
-            from datetime import timedelta
-            
             cutoff_date = datetime.now() - timedelta(days=days)
             cutoff_str = cutoff_date.strftime("%Y%m%d")
             
-            logger.info(f"开始清理 {days} 天前的同步数据 (截止日期: {cutoff_str})")
+            logger.info("开始清理 %s 天前的同步数据 (截止日期: %s)", days, cutoff_str)
+            
+            # 文件路径到从应用ID的反向索引，避免每删除一个文件都遍历全部从应用
+            path_to_slave = {data["file_path"]: slave_id for slave_id, data in self.synced_data.items()}
+            slaves_to_remove = set()
             
             files_deleted = 0
-            for filename in os.listdir(self.data_directory):
-                if filename.startswith("sync_") and filename.endswith(".json"):
-                    file_path = os.path.join(self.data_directory, filename)
-                    file_date_str = filename.split("_")[2]  # 格式: sync_slaveid_timestamp.json
-                    
-                    if file_date_str < cutoff_str:
-                        os.remove(file_path)
+            with os.scandir(self.data_directory) as entries:
+                for entry in entries:
+                    match = SYNC_FILE_RE.match(entry.name)
+                    if not match or not entry.is_file():
+                        continue
+                    if match.group("date") < cutoff_str:
+                        os.unlink(entry.path)
                         files_deleted += 1
-                        
-                        # 更新内存中的数据
-                        for slave_id, data in self.synced_data.items():
-                            if data["file_path"] == file_path:
-                                del self.synced_data[slave_id]
-                                break
+                        if entry.path in path_to_slave:
+                            slaves_to_remove.add(path_to_slave[entry.path])
+            
+            # 遍历结束后再更新内存中的数据
+            for slave_id in slaves_to_remove:
+                self.synced_data.pop(slave_id, None)
             
-            logger.info(f"清理完成，共删除 {files_deleted} 个文件")
+            logger.info("清理完成，共删除 %s 个文件", files_deleted)
             return files_deleted
         except Exception as e:
-            logger.error(f"清理旧数据失败: {str(e)}")
+            logger.error("清理旧数据失败: %s", e)
             return 0
     
     async def broadcast_to_slaves(self, message: Dict) -> Dict[str, Dict]:
@@ -110,7 +129,7 @@ class MasterSync:
         for slave_id in self.slaves:
             # 这里需要实现与从应用的通信逻辑
             # 实际应用中可能需要维护从应用的IP和端口信息
-            logger.info(f"向从应用 {slave_id} 广播消息")
+            logger.info("向从应用 %s 广播消息", slave_id)
             results[slave_id] = {"status": "pending", "message": "广播请求已发送"}
         
         return results
@@ -130,7 +149,7 @@ class MasterSync:
                 "slave_id": slave_id,
                 "last_sync": data["last_sync"],
                 "data_file": data["file_path"],
-                "data_size": os.path.getsize(data["file_path"]) if os.path.exists(data["file_path"]) else 0
+                "data_size": data.get("size", 0)
             }
             report["slave_details"].append(slave_report)
         
@@ -162,4 +181,5 @@ async def main():
     print(f"同步报告: {json.dumps(report, ensure_ascii=False, indent=2)}")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     asyncio.run(main())
\ No newline at end of file
@@ -1,11 +1,19 @@
+import asyncio
+import aiohttp
 import requests
+from requests.adapters import HTTPAdapter
+from requests_toolbelt import MultipartEncoder
+from urllib3.util.retry import Retry
 import logging
 import os
+from contextlib import ExitStack
 from typing import Optional, List, Dict
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 支持的图片格式
+IMAGE_EXTENSIONS = frozenset({".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff"})
+
 class RagflowClient:
     def __init__(self, ragflow_url: str, api_key: str, dataset_id: Optional[int] = None):
         self.ragflow_url = ragflow_url.rstrip('/')
@@ -15,15 +23,33 @@ class RagflowClient:
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
+        
+        # 所有请求复用同一个会话的连接池，避免每次请求重新建立TCP/TLS连接
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        retry = Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def close(self):
+        """关闭会话及其连接池"""
+        self.session.close()
     
     def test_connection(self) -> bool:
         """测试与Ragflow的连接"""
         try:
             url = f"{self.ragflow_url}/api/v1/datasets"
-            response = requests.get(url, headers=self.headers, timeout=10)
+            response = self.session.get(url, timeout=10)
             return response.status_code == 200
         except Exception as e:
-            logger.error(f"测试Ragflow连接失败: {str(e)}")
+            logger.error("测试Ragflow连接失败: %s", e)
             return False
     
     def upload_file(self, file_path: str, dataset_id: Optional[int] = None) -> Dict:
@@ -35,18 +61,20 @@ class RagflowClient:
             
             url = f"{self.ragflow_url}/api/v1/datasets/{dataset_id}/documents/upload"
             
-            # 使用multipart/form-data上传文件
-            files = {
-                'file': (os.path.basename(file_path), open(file_path, 'rb'))
-            }
-            
-            # 不使用headers中的Content-Type，让requests自动处理
-            upload_headers = {"Authorization": self.headers["Authorization"]}
-            
-            response = requests.post(url, headers=upload_headers, files=files, timeout=300)
+            # 使用multipart/form-data流式上传文件，按块读取，不把整个文件读入内存
+            with open(file_path, 'rb') as f:
+                encoder = MultipartEncoder(fields={
+                    'file': (os.path.basename(file_path), f, 'application/octet-stream')
+                })
+                upload_headers = {
+                    "Authorization": self.headers["Authorization"],
+                    "Content-Type": encoder.content_type
+                }
+                
+                response = self.session.post(url, headers=upload_headers, data=encoder, timeout=300)
             response.raise_for_status()
             
-            logger.info(f"文件 {file_path} 上传到Ragflow成功")
+            logger.info("文件 %s 上传到Ragflow成功", file_path)
             result = response.json()
             
             # 如果是图片文件，添加图片标记
@@ -56,13 +84,12 @@ class RagflowClient:
             
             return result
         except Exception as e:
-            logger.error(f"上传文件 {file_path} 到Ragflow失败: {str(e)}")
+            logger.error("上传文件 %s 到Ragflow失败: %s", file_path, e)
             return {"status": "error", "message": str(e)}
     
     def _is_image_file(self, file_path: str) -> bool:
         """判断文件是否为图片"""
-        image_extensions = [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff"]
-        return os.path.splitext(file_path)[1].lower() in image_extensions
+        return os.path.splitext(file_path)[1].lower() in IMAGE_EXTENSIONS
     
     def upload_files(self, file_paths: List[str], dataset_id: Optional[int] = None) -> List[Dict]:
         """批量上传文件到Ragflow"""
@@ -75,7 +102,7 @@ class RagflowClient:
                     "result": result
                 })
             else:
-                logger.warning(f"文件 {file_path} 不存在，跳过上传")
+                logger.warning("文件 %s 不存在，跳过上传", file_path)
                 results.append({
                     "file_path": file_path,
                     "result": {"status": "error", "message": "文件不存在"}
@@ -101,24 +128,24 @@ class RagflowClient:
                 "stream": False
             }
             
-            response = requests.post(url, headers=self.headers, json=data, timeout=60)
+            response = self.session.post(url, json=data, timeout=60)
             response.raise_for_status()
             
-            logger.info(f"向Ragflow查询成功: {question}")
+            logger.info("向Ragflow查询成功: %s", question)
             return response.json()
         except Exception as e:
-            logger.error(f"向Ragflow查询失败: {str(e)}")
+            logger.error("向Ragflow查询失败: %s", e)
             return {"status": "error", "message": str(e)}
     
     def get_datasets(self) -> List[Dict]:
         """获取所有数据集"""
         try:
             url = f"{self.ragflow_url}/api/v1/datasets"
-            response = requests.get(url, headers=self.headers, timeout=10)
+            response = self.session.get(url, timeout=10)
             response.raise_for_status()
             return response.json()
         except Exception as e:
-            logger.error(f"获取Ragflow数据集失败: {str(e)}")
+            logger.error("获取Ragflow数据集失败: %s", e)
             return []
     
     def get_dataset_info(self, dataset_id: Optional[int] = None) -> Optional[Dict]:
@@ -129,27 +156,207 @@ class RagflowClient:
                 raise ValueError("需要提供数据集ID")
             
             url = f"{self.ragflow_url}/api/v1/datasets/{dataset_id}"
-            response = requests.get(url, headers=self.headers, timeout=10)
+            response = self.session.get(url, timeout=10)
             response.raise_for_status()
             return response.json()
         except Exception as e:
-            logger.error(f"获取数据集信息失败: {str(e)}")
+            logger.error("获取数据集信息失败: %s", e)
             return None
     
     def delete_document(self, document_id: str) -> bool:
         """删除文档"""
         try:
             url = f"{self.ragflow_url}/api/v1/documents/{document_id}"
-            response = requests.delete(url, headers=self.headers, timeout=10)
+            response = self.session.delete(url, timeout=10)
             response.raise_for_status()
-            logger.info(f"删除文档 {document_id} 成功")
+            logger.info("删除文档 %s 成功", document_id)
+            return True
+        except Exception as e:
+            logger.error("删除文档 %s 失败: %s", document_id, e)
+            return False
+
+class AsyncRagflowClient:
+    """异步Ragflow客户端，所有请求复用同一个aiohttp会话的连接池"""
+    
+    # 遇到这些状态码时按指数退避重试
+    RETRY_STATUSES = frozenset({500, 502, 503, 504})
+    
+    # 批量上传时同时进行的上传数上限
+    UPLOAD_CONCURRENCY = 4
+    
+    def __init__(self, ragflow_url: str, api_key: str, dataset_id: Optional[int] = None, max_retries: int = 3):
+        self.ragflow_url = ragflow_url.rstrip('/')
+        self.api_key = api_key
+        self.dataset_id = dataset_id
+        self.max_retries = max_retries
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+        self._session: Optional[aiohttp.ClientSession] = None
+    
+    async def __aenter__(self):
+        self._get_session()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取长期复用的会话，首次使用时创建"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=64, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(connector=connector, headers=self.headers)
+        return self._session
+    
+    async def close(self):
+        """关闭会话及其连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    async def _request(self, method: str, url: str, timeout: int, file_path: Optional[str] = None, **kwargs):
+        """发送请求并返回JSON结果，遇到5xx或网络错误时按指数退避重试"""
+        session = self._get_session()
+        client_timeout = aiohttp.ClientTimeout(total=timeout)
+        
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(0.3 * 2 ** (attempt - 1))
+            
+            try:
+                with ExitStack() as stack:
+                    if file_path is not None:
+                        # 每次尝试重新打开文件，aiohttp按块读取并发送，不会整体读入内存
+                        form = aiohttp.FormData()
+                        form.add_field("file", stack.enter_context(open(file_path, "rb")),
+                                       filename=os.path.basename(file_path))
+                        kwargs["data"] = form
+                    
+                    async with session.request(method, url, timeout=client_timeout, **kwargs) as response:
+                        if response.status in self.RETRY_STATUSES and attempt < self.max_retries:
+                            logger.warning("Ragflow返回 %s，准备重试: %s", response.status, url)
+                            continue
+                        response.raise_for_status()
+                        return await response.json(content_type=None)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning("请求Ragflow失败，准备重试: %s", e)
+    
+    async def test_connection(self) -> bool:
+        """测试与Ragflow的连接"""
+        try:
+            url = f"{self.ragflow_url}/api/v1/datasets"
+            async with self._get_session().get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                return response.status == 200
+        except Exception as e:
+            logger.error("测试Ragflow连接失败: %s", e)
+            return False
+    
+    async def upload_file(self, file_path: str, dataset_id: Optional[int] = None) -> Dict:
+        """上传文件到Ragflow"""
+        try:
+            dataset_id = dataset_id or self.dataset_id
+            if not dataset_id:
+                raise ValueError("需要提供数据集ID")
+            
+            url = f"{self.ragflow_url}/api/v1/datasets/{dataset_id}/documents/upload"
+            result = await self._request("POST", url, timeout=300, file_path=file_path)
+            
+            logger.info("文件 %s 上传到Ragflow成功", file_path)
+            
+            # 如果是图片文件，添加图片标记
+            if os.path.splitext(file_path)[1].lower() in IMAGE_EXTENSIONS:
+                result["is_image"] = True
+                result["image_path"] = file_path
+            
+            return result
+        except Exception as e:
+            logger.error("上传文件 %s 到Ragflow失败: %s", file_path, e)
+            return {"status": "error", "message": str(e)}
+    
+    async def upload_files(self, file_paths: List[str], dataset_id: Optional[int] = None) -> List[Dict]:
+        """并发批量上传文件到Ragflow，结果顺序与输入一致
+        
+        同时进行的上传数受UPLOAD_CONCURRENCY限制，避免大量附件同时占用连接和带宽
+        """
+        semaphore = asyncio.Semaphore(self.UPLOAD_CONCURRENCY)
+        
+        async def upload_one(file_path: str) -> Dict:
+            if not os.path.exists(file_path):
+                logger.warning("文件 %s 不存在，跳过上传", file_path)
+                return {
+                    "file_path": file_path,
+                    "result": {"status": "error", "message": "文件不存在"}
+                }
+            async with semaphore:
+                return {
+                    "file_path": file_path,
+                    "result": await self.upload_file(file_path, dataset_id)
+                }
+        
+        return list(await asyncio.gather(*(upload_one(file_path) for file_path in file_paths)))
+    
+    async def query(self, question: str, dataset_id: Optional[int] = None, top_k: int = 3) -> Dict:
+        """向Ragflow查询问题"""
+        try:
+            dataset_id = dataset_id or self.dataset_id
+            if not dataset_id:
+                raise ValueError("需要提供数据集ID")
+            
+            url = f"{self.ragflow_url}/api/v1/datasets/{dataset_id}/chat/completions"
+            data = {
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": question
+                    }
+                ],
+                "top_k": top_k,
+                "stream": False
+            }
+            
+            result = await self._request("POST", url, timeout=60, json=data)
+            logger.info("向Ragflow查询成功: %s", question)
+            return result
+        except Exception as e:
+            logger.error("向Ragflow查询失败: %s", e)
+            return {"status": "error", "message": str(e)}
+    
+    async def get_datasets(self) -> List[Dict]:
+        """获取所有数据集"""
+        try:
+            url = f"{self.ragflow_url}/api/v1/datasets"
+            return await self._request("GET", url, timeout=10)
+        except Exception as e:
+            logger.error("获取Ragflow数据集失败: %s", e)
+            return []
+    
+    async def get_dataset_info(self, dataset_id: Optional[int] = None) -> Optional[Dict]:
+        """获取特定数据集的信息"""
+        try:
+            dataset_id = dataset_id or self.dataset_id
+            if not dataset_id:
+                raise ValueError("需要提供数据集ID")
+            
+            url = f"{self.ragflow_url}/api/v1/datasets/{dataset_id}"
+            return await self._request("GET", url, timeout=10)
+        except Exception as e:
+            logger.error("获取数据集信息失败: %s", e)
+            return None
+    
+    async def delete_document(self, document_id: str) -> bool:
+        """删除文档"""
+        try:
+            url = f"{self.ragflow_url}/api/v1/documents/{document_id}"
+            await self._request("DELETE", url, timeout=10)
+            logger.info("删除文档 %s 成功", document_id)
             return True
         except Exception as e:
-            logger.error(f"删除文档 {document_id} 失败: {str(e)}")
+            logger.error("删除文档 %s 失败: %s", document_id, e)
             return False
 
 # 测试代码
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     # 示例用法
     client = RagflowClient(
         ragflow_url="http://localhost:9380",
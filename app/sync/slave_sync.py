@@ -3,129 +3,177 @@ import aiohttp
 import logging
 import json
 import os
+import platform
 import socket
 from datetime import datetime
 from typing import Dict, Optional
-from app.outlook.outlook_reader import OutlookReader
+from app.outlook.outlook_reader import OUTLOOK_LOCK, OutlookReader
 from app.config.settings import load_config
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 同步请求的总超时（秒）
+SYNC_TIMEOUT = 30
+
+# 时间戳显示格式
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# 进程运行期间不会变化的平台信息，导入时查询一次
+PLATFORM_INFO = {
+    "os": platform.system(),
+    "os_version": platform.version(),
+    "python_version": platform.python_version()
+}
+
+def _now() -> str:
+    """返回当前时间的格式化字符串"""
+    return datetime.now().strftime(TIME_FORMAT)
+
 class SlaveSync:
     def __init__(self):
         self.config = load_config()
         self.master_url = f"http://{self.config['master_ip']}:{self.config['master_port']}"
+        # 主机名和IP只在初始化时解析一次；gethostbyname可能因DNS阻塞数秒，
+        # 在事件循环中创建实例时应放到工作线程中执行（见web应用的lifespan）
+        self._hostname = socket.gethostname()
+        try:
+            self._ip = socket.gethostbyname(self._hostname)
+        except socket.gaierror:
+            self._ip = "0.0.0.0"
         self.slave_id = self._get_slave_id()
         self.is_running = False
         self.last_sync_time = None
         self.last_sync_result = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._stop_event = asyncio.Event()
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取长期复用的会话，各次同步共用连接，避免每次重新握手"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=10, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=SYNC_TIMEOUT)
+            )
+        return self._session
+    
+    async def close(self):
+        """关闭会话及其连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
     
     def _get_slave_id(self) -> str:
         """生成从应用的唯一ID"""
-        hostname = socket.gethostname()
-        ip_address = socket.gethostbyname(hostname)
-        return f"{hostname}_{ip_address}"
+        return f"{self._hostname}_{self._ip}"
     
     async def collect_outlook_info(self) -> Dict:
         """收集本地Outlook信息"""
         try:
             logger.info("开始收集Outlook信息")
             
-            reader = OutlookReader()
-            if not reader.connect():
-                return {
-                    "status": "error",
-                    "message": "无法连接到Outlook"
-                }
-            
-            # 获取邮件信息
-            emails = reader.get_emails_by_subject(self.config.get("subject_keyword", "工单"))
-            
-            # 收集关键信息
-            outlook_info = {
-                "total_emails": len(emails),
-                "last_collected": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "subject_keyword": self.config.get("subject_keyword", "工单"),
-                "outlook_folder": self.config.get("outlook_folder", "收件箱"),
-                "recent_emails": []
-            }
-            
-            # 获取最近的5封邮件信息
-            for i, email in enumerate(emails[:5]):
-                try:
-                    email_details = reader.get_email_details(email)
-                    outlook_info["recent_emails"].append({
-                        "subject": email_details["subject"],
-                        "sender": email_details["sender_name"],
-                        "received_time": email_details["received_time"],
-                        "attachments_count": email_details["attachments_count"]
-                    })
-                except Exception as e:
-                    logger.error(f"获取邮件 {i+1} 信息失败: {str(e)}")
-                    continue
-            
-            reader.disconnect()
-            logger.info(f"成功收集Outlook信息，共找到 {len(emails)} 封邮件")
+            # Outlook COM调用会阻塞，且COM对象不能跨线程使用，
+            # 因此把连接、读取、断开整体放到同一个工作线程中执行
+            # 持有OUTLOOK_LOCK，与连接测试等其他Outlook访问互斥
+            async with OUTLOOK_LOCK:
+                outlook_info = await asyncio.to_thread(self._collect_outlook_info_sync)
             
+            if outlook_info.get("status") != "error":
+                logger.info("成功收集Outlook信息，共找到 %s 封邮件", outlook_info['total_emails'])
             return outlook_info
         except Exception as e:
-            logger.error(f"收集Outlook信息失败: {str(e)}")
+            logger.error("收集Outlook信息失败: %s", e)
             return {
                 "status": "error",
                 "message": f"收集失败: {str(e)}"
             }
     
-    async def collect_system_info(self) -> Dict:
-        """收集系统信息"""
-        import platform
+    def _collect_outlook_info_sync(self) -> Dict:
+        """在当前线程中连接Outlook并收集信息，无论成功与否都会断开连接"""
+        reader = OutlookReader()
+        try:
+            if not reader.connect():
+                return {
+                    "status": "error",
+                    "message": "无法连接到Outlook"
+                }
+            return self._read_outlook_info(reader)
+        finally:
+            reader.disconnect()
+    
+    def _read_outlook_info(self, reader: OutlookReader) -> Dict:
+        """读取邮件信息，返回前释放对邮件COM对象的引用"""
+        # 获取邮件信息
+        emails = reader.get_emails_by_subject(self.config.get("subject_keyword", "工单"))
         
-        system_info = {
-            "hostname": socket.gethostname(),
-            "ip_address": socket.gethostbyname(socket.gethostname()),
-            "os": platform.system(),
-            "os_version": platform.version(),
-            "python_version": platform.python_version(),
-            "collect_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # 收集关键信息
+        outlook_info = {
+            "total_emails": len(emails),
+            "last_collected": _now(),
+            "subject_keyword": self.config.get("subject_keyword", "工单"),
+            "outlook_folder": self.config.get("outlook_folder", "收件箱"),
+            "recent_emails": []
         }
         
-        return system_info
+        # 获取最近的5封邮件信息
+        for i, email in enumerate(emails[:5]):
+            try:
+                email_details = reader.get_email_details(email)
+                outlook_info["recent_emails"].append({
+                    "subject": email_details["subject"],
+                    "sender": email_details["sender_name"],
+                    "received_time": email_details["received_time"],
+                    "attachments_count": email_details["attachments_count"]
+                })
+            except Exception as e:
+                logger.error("获取邮件 %s 信息失败: %s", i+1, e)
+                continue
+        
+        return outlook_info
+    
+    def collect_system_info(self) -> Dict:
+        """收集系统信息"""
+        return {
+            "hostname": self._hostname,
+            "ip_address": self._ip,
+            **PLATFORM_INFO,
+            "collect_time": _now()
+        }
     
     async def sync_to_master(self):
         """同步数据到主应用"""
         try:
-            logger.info(f"开始向主应用 {self.master_url} 同步数据")
+            logger.info("开始向主应用 %s 同步数据", self.master_url)
             
             # 收集数据
             outlook_info = await self.collect_outlook_info()
-            system_info = await self.collect_system_info()
+            system_info = self.collect_system_info()
             
             # 构建同步数据
             sync_data = {
                 "slave_id": self.slave_id,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "timestamp": _now(),
                 "outlook_info": outlook_info,
                 "system_info": system_info,
                 "config": self.config
             }
             
             # 发送到主应用
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.master_url}/api/sync",
-                    json=sync_data,
-                    headers={"Content-Type": "application/json"}
-                ) as response:
-                    result = await response.json()
-                    logger.info(f"同步结果: {result}")
-                    
-                    # 更新状态
-                    self.last_sync_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    self.last_sync_result = result
-                    
-                    return result
+            async with self._get_session().post(
+                f"{self.master_url}/api/sync",
+                json=sync_data,
+                headers={"Content-Type": "application/json"}
+            ) as response:
+                result = await response.json()
+                logger.info("同步结果: %s", result)
+                
+                # 更新状态
+                self.last_sync_time = _now()
+                self.last_sync_result = result
+                
+                return result
         except Exception as e:
-            logger.error(f"同步到主应用失败: {str(e)}")
+            logger.error("同步到主应用失败: %s", e)
             self.last_sync_result = {
                 "status": "error",
                 "message": f"同步失败: {str(e)}"
@@ -135,20 +183,23 @@ class SlaveSync:
     async def start_sync_loop(self):
         """开始同步循环"""
         self.is_running = True
-        logger.info(f"开始同步循环，间隔 {self.config['sync_interval']} 秒")
+        self._stop_event.clear()
+        logger.info("开始同步循环，间隔 %s 秒", self.config['sync_interval'])
         
         while self.is_running:
             await self.sync_to_master()
             
-            # 等待下一次同步
-            for _ in range(self.config['sync_interval']):
-                if not self.is_running:
-                    break
-                await asyncio.sleep(1)
+            # 等待下一次同步，停止时事件被置位可立即退出
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.config['sync_interval'])
+                break
+            except asyncio.TimeoutError:
+                pass
     
     def stop_sync_loop(self):
         """停止同步循环"""
         self.is_running = False
+        self._stop_event.set()
         logger.info("同步循环已停止")
     
     def get_sync_status(self) -> Dict:
@@ -164,19 +215,22 @@ class SlaveSync:
 
 # 测试代码
 async def main():
-    slave = SlaveSync()
+    slave = await asyncio.to_thread(SlaveSync)
     
     # 测试收集Outlook信息
     outlook_info = await slave.collect_outlook_info()
     print(f"Outlook信息: {json.dumps(outlook_info, ensure_ascii=False, indent=2)}")
     
     # 测试收集系统信息
-    system_info = await slave.collect_system_info()
+    system_info = slave.collect_system_info()
     print(f"系统信息: {json.dumps(system_info, ensure_ascii=False, indent=2)}")
     
     # 测试同步（需要主应用运行）
     # result = await slave.sync_to_master()
     # print(f"同步结果: {json.dumps(result, ensure_ascii=False, indent=2)}")
+    
+    await slave.close()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     asyncio.run(main())
\ No newline at end of file
@@ -1,11 +1,19 @@
-from fastapi import FastAPI, Request, Form, HTTPException
+from fastapi import APIRouter, FastAPI, Request, Form, HTTPException
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, FileResponse
+from jinja2 import FileSystemBytecodeCache
+from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, Response
 import os
+import stat
 import logging
 import asyncio
+import threading
+import time
+import orjson
+from contextlib import asynccontextmanager
 from datetime import datetime
+from pathlib import Path
+from types import MappingProxyType
 
 # 添加配置管理模块导入
 from app.config.settings import load_config, update_config, reset_config, init_config, get_config_value
@@ -13,49 +21,187 @@ from app.config.settings import load_config, update_config, reset_config, init_c
 # 添加同步模块导入
 from app.sync.master_sync import MasterSync
 from app.sync.slave_sync import SlaveSync
-from app.sync.ragflow_client import RagflowClient
+from app.sync.ragflow_client import AsyncRagflowClient
 
 # 添加Outlook模块导入
-from app.outlook.outlook_reader import OutlookReader
+from app.outlook.outlook_reader import OUTLOOK_LOCK, OutlookReader
 
-# 初始化同步管理器
-sync_data_dir = os.path.join(os.path.expanduser("~"), "outlook_tickets", "sync_data")
-master_sync = MasterSync(sync_data_dir)
+# 配置日志（程序入口处统一配置一次）
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class OrjsonResponse(Response):
+    """用orjson编码的JSON响应，比标准库json快
+    
+    直接继承Response实现，不依赖新版FastAPI中已弃用的ORJSONResponse
+    """
+    media_type = "application/json"
+    
+    def render(self, content):
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+# 路径常量，导入时计算一次
+BASE_DIR = Path(__file__).resolve().parents[1]  # app目录
+TEMPLATES_DIR = BASE_DIR / "templates"
+STATIC_DIR = BASE_DIR / "static"
+DEFAULT_OUTPUT = Path.home() / "outlook_tickets"
+
+# 同步管理器在应用启动时（lifespan）创建，保证每个服务进程只创建一次
+sync_data_dir = str(DEFAULT_OUTPUT / "sync_data")
+master_sync = None
 slave_sync = None
+_sync_task = None  # 正在运行的从应用同步循环任务
+
+# 配置缓存：配置只通过本应用的接口修改，各请求直接读取内存中的配置，
+# 修改或重置配置后使缓存失效（handlers只读取返回的字典，不应修改它）
+_config_cache = None
+_config_lock = threading.Lock()
+
+def get_cached_config():
+    """获取缓存的配置，首次调用或缓存失效后从配置文件加载"""
+    global _config_cache
+    config_data = _config_cache
+    if config_data is None:
+        with _config_lock:
+            if _config_cache is None:
+                _config_cache = load_config()
+            config_data = _config_cache
+    return config_data
+
+def invalidate_config_cache():
+    """配置被修改后使缓存失效"""
+    global _config_cache, _output_root
+    with _config_lock:
+        _config_cache = None
+        _output_root = None
+
+# 解析后的输出根目录，随配置缓存一起失效
+_output_root = None
+
+def get_output_root():
+    """获取解析为绝对路径的输出目录"""
+    global _output_root
+    output_root = _output_root
+    if output_root is None:
+        config_data = get_cached_config()
+        output_dir = config_data.get("output_directory", DEFAULT_OUTPUT)
+        output_root = _output_root = Path(output_dir).resolve()
+    return output_root
+
+# Ragflow客户端池：按(url, api_key, dataset_id)复用异步客户端及其连接池，
+# 省去每个请求重新建立TCP/TLS连接；配置变更或应用关闭时清空
+_ragflow_clients = {}
+
+def get_ragflow_client(ragflow_url, ragflow_api_key, ragflow_dataset_id=None):
+    """获取（必要时创建）与给定凭据对应的Ragflow客户端"""
+    key = (ragflow_url, ragflow_api_key, ragflow_dataset_id)
+    client = _ragflow_clients.get(key)
+    if client is None:
+        client = _ragflow_clients[key] = AsyncRagflowClient(ragflow_url, ragflow_api_key, ragflow_dataset_id)
+    return client
+
+async def clear_ragflow_clients():
+    """关闭并清空已缓存的Ragflow客户端（凭据可能已变化）"""
+    clients = list(_ragflow_clients.values())
+    _ragflow_clients.clear()
+    for client in clients:
+        await client.close()
+
+# 同步报告缓存：仪表盘轮询时在TTL内复用同一份报告，收到新的同步数据后失效
+REPORT_CACHE_TTL = 2.0
+_report_cache = {"time": 0.0, "report": None}
+
+def cached_report():
+    """获取同步报告，超过REPORT_CACHE_TTL秒才重新生成"""
+    now = time.monotonic()
+    if _report_cache["report"] is None or now - _report_cache["time"] > REPORT_CACHE_TTL:
+        _report_cache["report"] = master_sync.generate_sync_report()
+        _report_cache["time"] = now
+    return _report_cache["report"]
+
+def invalidate_report_cache():
+    """同步数据变化后使报告缓存失效"""
+    _report_cache["report"] = None
 
 # 从配置获取应用模式
-config = load_config()
+config = get_cached_config()
 app_mode = config.get("app_mode", "standalone")
 
-# 如果是从应用模式，初始化从应用同步器
-if app_mode == "slave":
-    slave_sync = SlaveSync()
-
-# 配置日志
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
+def start_sync_task():
+    """在当前事件循环中启动从应用同步循环并保存任务引用"""
+    global _sync_task
+    _sync_task = asyncio.create_task(slave_sync.start_sync_loop())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时创建同步管理器，从应用模式下自动开始同步循环；
+    关闭时停止同步循环并释放各客户端的连接池"""
+    global master_sync, slave_sync
+    master_sync = MasterSync(sync_data_dir)
+    if app_mode == "slave":
+        # 初始化时会读取配置并解析本机IP，放到工作线程中避免DNS查询阻塞事件循环
+        slave_sync = await asyncio.to_thread(SlaveSync)
+        start_sync_task()
+    
+    try:
+        yield
+    finally:
+        if slave_sync:
+            slave_sync.stop_sync_loop()
+            if _sync_task and not _sync_task.done():
+                # 正在进行的同步可能要等到请求超时，直接取消
+                _sync_task.cancel()
+                try:
+                    await _sync_task
+                except asyncio.CancelledError:
+                    pass
+            await slave_sync.close()
+        await clear_ragflow_clients()
 
 # 创建FastAPI应用
 app = FastAPI(
     title="Outlook工单管理系统",
     description="用于读取Outlook工单邮件并管理的Web应用",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=OrjsonResponse  # 用orjson编码JSON响应
 )
 
-# 配置模板和静态文件
-templates_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
-static_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+# 开发模式：通过环境变量DEV_MODE=1开启
+DEV_MODE = os.environ.get("DEV_MODE", "").lower() in ("1", "true", "yes")
 
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
-templates = Jinja2Templates(directory=templates_dir)
+# 配置模板和静态文件
+# 静态资源的浏览器缓存时间（秒）；文件名不含内容哈希，因此不标记immutable
+STATIC_CACHE_CONTROL = "public, max-age=86400"
 
-# 全局变量
-app_state = {
+class CachedStaticFiles(StaticFiles):
+    """为静态资源添加Cache-Control头，重复访问页面时浏览器无需再次请求"""
+    
+    async def get_response(self, path, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = STATIC_CACHE_CONTROL
+        return response
+
+app.mount("/static", CachedStaticFiles(directory=STATIC_DIR), name="static")
+templates = Jinja2Templates(directory=TEMPLATES_DIR)
+# 编译后的模板字节码缓存到临时目录，重启后无需重新解析编译模板
+templates.env.bytecode_cache = FileSystemBytecodeCache()
+# 生产环境下模板不会变化，关闭每次渲染前的文件修改检查；开发模式下保留
+templates.env.auto_reload = DEV_MODE
+
+# 全局变量：_app_state只在本模块的接口中修改，模板等读取方使用只读视图app_state
+_app_state = {
     "last_sync_time": None,
     "total_tickets_processed": 0,
     "is_running": False,
     "current_mode": "standalone"  # standalone, master, slave
 }
+app_state = MappingProxyType(_app_state)
+
+async def read_json(request: Request):
+    """用orjson解析请求体中的JSON，比Request.json()使用的标准库json更快"""
+    return orjson.loads(await request.body())
 
 # 首页路由
 @app.get("/", response_class=HTMLResponse)
@@ -68,7 +214,7 @@ async def index(request: Request):
 # 配置页面路由 - 更新为从配置文件加载
 @app.get("/config", response_class=HTMLResponse)
 async def config_page(request: Request):
-    config_data = load_config()
+    config_data = get_cached_config()
     return templates.TemplateResponse(
         "config.html", 
         {"request": request, "config": config_data}
@@ -93,271 +239,292 @@ async def ragflow_page(request: Request):
 # API: 获取应用状态
 @app.get("/api/status")
 async def get_status():
-    return JSONResponse(content=app_state)
+    return OrjsonResponse(content=_app_state)
 
 # API: 更新应用状态
 @app.post("/api/status")
 async def update_status(request: Request):
-    data = await request.json()
-    app_state.update(data)
-    return JSONResponse(content={"message": "状态更新成功"})
+    global _app_state
+    data = await read_json(request)
+    _app_state |= data
+    return OrjsonResponse(content={"message": "状态更新成功"})
+
+def _test_outlook_connection():
+    """在当前线程中连接并断开Outlook，返回是否连接成功"""
+    reader = OutlookReader()
+    try:
+        return reader.connect()
+    finally:
+        reader.disconnect()
 
 # API: 测试Outlook连接
 @app.get("/api/test-outlook")
 async def test_outlook():
     try:
-        reader = OutlookReader()
-        success = reader.connect()
+        # COM调用会阻塞，连接和断开放到同一个工作线程中执行；
+        # 持有OUTLOOK_LOCK，与从应用同步等其他Outlook访问互斥
+        async with OUTLOOK_LOCK:
+            success = await asyncio.to_thread(_test_outlook_connection)
         if success:
-            reader.disconnect()
-            return JSONResponse(content={"success": True, "message": "Outlook连接测试成功"})
+            return OrjsonResponse(content={"success": True, "message": "Outlook连接测试成功"})
         else:
-            return JSONResponse(content={"success": False, "message": "Outlook连接测试失败"})
+            return OrjsonResponse(content={"success": False, "message": "Outlook连接测试失败"})
     except Exception as e:
-        logger.error(f"Outlook测试失败: {str(e)}")
-        return JSONResponse(content={"success": False, "message": f"测试失败: {str(e)}"})
+        logger.error("Outlook测试失败: %s", e)
+        return OrjsonResponse(content={"success": False, "message": f"测试失败: {str(e)}"})
 
 # API: 手动触发邮件处理
 @app.post("/api/process-emails")
 async def process_emails(request: Request):
     try:
         # 这里会在实现邮件处理功能后更新
-        return JSONResponse(content={"success": True, "message": "邮件处理功能待实现"})
+        return OrjsonResponse(content={"success": True, "message": "邮件处理功能待实现"})
     except Exception as e:
-        logger.error(f"处理邮件失败: {str(e)}")
+        logger.error("处理邮件失败: %s", e)
         raise HTTPException(status_code=500, detail=f"处理邮件失败: {str(e)}")
 
 # 新增: API: 获取配置
 @app.get("/api/config")
 async def get_config():
-    config_data = load_config()
-    return JSONResponse(content=config_data)
+    config_data = get_cached_config()
+    return OrjsonResponse(content=config_data)
 
 # 新增: API: 更新配置
 @app.post("/api/config")
 async def update_config_api(request: Request):
     try:
-        data = await request.json()
+        data = await read_json(request)
         success = update_config(data)
         if success:
+            invalidate_config_cache()
+            await clear_ragflow_clients()
             # 更新应用状态中的模式
             if "app_mode" in data:
-                app_state["current_mode"] = data["app_mode"]
-            return JSONResponse(content={"success": True, "message": "配置保存成功"})
+                _app_state["current_mode"] = data["app_mode"]
+            return OrjsonResponse(content={"success": True, "message": "配置保存成功"})
         else:
-            return JSONResponse(content={"success": False, "message": "配置保存失败"})
+            return OrjsonResponse(content={"success": False, "message": "配置保存失败"})
     except Exception as e:
-        logger.error(f"更新配置失败: {str(e)}")
-        return JSONResponse(content={"success": False, "message": f"配置保存失败: {str(e)}"})
+        logger.error("更新配置失败: %s", e)
+        return OrjsonResponse(content={"success": False, "message": f"配置保存失败: {str(e)}"})
 
 # 新增: API: 重置配置
 @app.post("/api/config/reset")
 async def reset_config_api():
     success = reset_config()
     if success:
-        app_state["current_mode"] = "standalone"  # 重置为默认模式
-        return JSONResponse(content={"success": True, "message": "配置已重置为默认值"})
+        invalidate_config_cache()
+        await clear_ragflow_clients()
+        _app_state["current_mode"] = "standalone"  # 重置为默认模式
+        return OrjsonResponse(content={"success": True, "message": "配置已重置为默认值"})
     else:
-        return JSONResponse(content={"success": False, "message": "配置重置失败"})
+        return OrjsonResponse(content={"success": False, "message": "配置重置失败"})
 
 # 同步相关API端点
+# app_mode在进程启动时确定，仅注册当前模式可用的路由，其他模式的同步接口直接返回404
+master_router = APIRouter(prefix="/api/sync")
+slave_router = APIRouter(prefix="/api/sync")
 
 # API: 主应用接收从应用同步数据 (仅主应用模式)
-@app.post("/api/sync")
+@master_router.post("")
 async def receive_sync_data(request: Request):
-    global app_state
-    
-    if app_mode != "master":
-        return JSONResponse(content={"status": "error", "message": "当前不是主应用模式"})
-    
     try:
-        data = await request.json()
+        data = await read_json(request)
         slave_id = data.get("slave_id", "unknown")
         
         # 处理同步数据
         result = await master_sync.handle_slave_sync(slave_id, data)
+        if result.get("status") == "success":
+            invalidate_report_cache()
         
-        # 更新应用状态
-        app_state["last_sync_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # 更新应用状态（isoformat不经过strftime的格式解析，sep=" "时格式仍为YYYY-MM-DD HH:MM:SS）
+        _app_state["last_sync_time"] = datetime.now().isoformat(sep=" ", timespec="seconds")
         
-        return JSONResponse(content=result)
+        return OrjsonResponse(content=result)
     except Exception as e:
-        logger.error(f"处理同步数据失败: {str(e)}")
-        return JSONResponse(content={"status": "error", "message": f"处理失败: {str(e)}"})
+        logger.error("处理同步数据失败: %s", e)
+        return OrjsonResponse(content={"status": "error", "message": f"处理失败: {str(e)}"})
 
-# API: 获取同步状态
+# API: 获取同步状态（所有模式可用）
 @app.get("/api/sync/status")
 async def get_sync_status():
     if app_mode == "master":
-        return JSONResponse(content={
+        return OrjsonResponse(content={
             "mode": "master",
             "slaves": master_sync.get_synced_slaves(),
-            "report": master_sync.generate_sync_report()
+            "report": cached_report()
         })
     elif app_mode == "slave" and slave_sync:
-        return JSONResponse(content={
+        return OrjsonResponse(content={
             "mode": "slave",
             "status": slave_sync.get_sync_status()
         })
     else:
-        return JSONResponse(content={"mode": "standalone", "message": "当前处于独立模式，不支持同步功能"})
+        return OrjsonResponse(content={"mode": "standalone", "message": "当前处于独立模式，不支持同步功能"})
 
 # API: 手动触发从应用同步 (仅从应用模式)
-@app.post("/api/sync/manual")
+@slave_router.post("/manual")
 async def manual_sync():
-    if app_mode != "slave" or not slave_sync:
-        return JSONResponse(content={"status": "error", "message": "当前不是从应用模式"})
-    
     result = await slave_sync.sync_to_master()
-    return JSONResponse(content=result)
+    return OrjsonResponse(content=result)
 
 # API: 开始从应用同步循环 (仅从应用模式)
-@app.post("/api/sync/start")
+@slave_router.post("/start")
 async def start_sync():
-    if app_mode != "slave" or not slave_sync:
-        return JSONResponse(content={"status": "error", "message": "当前不是从应用模式"})
-    
-    if slave_sync.is_running:
-        return JSONResponse(content={"status": "error", "message": "同步循环已在运行中"})
+    if slave_sync.is_running or (_sync_task and not _sync_task.done()):
+        return OrjsonResponse(content={"status": "error", "message": "同步循环已在运行中"})
     
     # 启动同步循环
-    asyncio.create_task(slave_sync.start_sync_loop())
+    start_sync_task()
     
-    return JSONResponse(content={"status": "success", "message": "同步循环已启动"})
+    return OrjsonResponse(content={"status": "success", "message": "同步循环已启动"})
 
 # API: 停止从应用同步循环 (仅从应用模式)
-@app.post("/api/sync/stop")
+@slave_router.post("/stop")
 async def stop_sync():
-    if app_mode != "slave" or not slave_sync:
-        return JSONResponse(content={"status": "error", "message": "当前不是从应用模式"})
-    
     if not slave_sync.is_running:
-        return JSONResponse(content={"status": "error", "message": "同步循环未在运行中"})
+        return OrjsonResponse(content={"status": "error", "message": "同步循环未在运行中"})
     
     slave_sync.stop_sync_loop()
-    return JSONResponse(content={"status": "success", "message": "同步循环已停止"})
+    return OrjsonResponse(content={"status": "success", "message": "同步循环已停止"})
 
 # API: 获取同步报告 (仅主应用模式)
-@app.get("/api/sync/report")
+@master_router.get("/report")
 async def get_sync_report():
-    if app_mode != "master":
-        return JSONResponse(content={"status": "error", "message": "当前不是主应用模式"})
-    
-    report = master_sync.generate_sync_report()
-    return JSONResponse(content=report)
+    report = cached_report()
+    return OrjsonResponse(content=report)
+
+if app_mode == "master":
+    app.include_router(master_router)
+elif app_mode == "slave":
+    app.include_router(slave_router)
 
 # Ragflow相关API端点
 
 # API: 测试Ragflow连接
 @app.get("/api/ragflow/test")
 async def test_ragflow():
-    config = load_config()
+    config = get_cached_config()
     ragflow_url = config.get("ragflow_url", "")
     ragflow_api_key = config.get("ragflow_api_key", "")
     
     if not ragflow_url or not ragflow_api_key:
-        return JSONResponse(content={"success": False, "message": "Ragflow URL或API Key未配置"})
+        return OrjsonResponse(content={"success": False, "message": "Ragflow URL或API Key未配置"})
     
-    client = RagflowClient(ragflow_url, ragflow_api_key)
-    success = client.test_connection()
+    client = get_ragflow_client(ragflow_url, ragflow_api_key)
+    success = await client.test_connection()
     
     if success:
-        return JSONResponse(content={"success": True, "message": "Ragflow连接测试成功"})
+        return OrjsonResponse(content={"success": True, "message": "Ragflow连接测试成功"})
     else:
-        return JSONResponse(content={"success": False, "message": "Ragflow连接测试失败"})
+        return OrjsonResponse(content={"success": False, "message": "Ragflow连接测试失败"})
 
 # API: 上传文件到Ragflow
 @app.post("/api/ragflow/upload")
 async def upload_to_ragflow(request: Request):
     try:
-        data = await request.json()
+        data = await read_json(request)
         file_paths = data.get("file_paths", [])
         
         if not file_paths:
-            return JSONResponse(content={"success": False, "message": "没有提供要上传的文件路径"})
+            return OrjsonResponse(content={"success": False, "message": "没有提供要上传的文件路径"})
         
-        config = load_config()
+        config = get_cached_config()
         ragflow_url = config.get("ragflow_url", "")
         ragflow_api_key = config.get("ragflow_api_key", "")
         ragflow_dataset_id = config.get("ragflow_dataset_id")
         
         if not ragflow_url or not ragflow_api_key:
-            return JSONResponse(content={"success": False, "message": "Ragflow URL或API Key未配置"})
+            return OrjsonResponse(content={"success": False, "message": "Ragflow URL或API Key未配置"})
         
         if not ragflow_dataset_id:
-            return JSONResponse(content={"success": False, "message": "Ragflow数据集ID未配置"})
+            return OrjsonResponse(content={"success": False, "message": "Ragflow数据集ID未配置"})
         
-        client = RagflowClient(ragflow_url, ragflow_api_key, ragflow_dataset_id)
-        results = client.upload_files(file_paths)
+        client = get_ragflow_client(ragflow_url, ragflow_api_key, ragflow_dataset_id)
+        results = await client.upload_files(file_paths)
         
-        return JSONResponse(content={
+        return OrjsonResponse(content={
             "success": True,
             "message": f"成功上传 {len([r for r in results if r['result'].get('status', '') != 'error'])} 个文件",
             "results": results
         })
     except Exception as e:
-        logger.error(f"上传文件到Ragflow失败: {str(e)}")
-        return JSONResponse(content={"success": False, "message": f"上传失败: {str(e)}"})
+        logger.error("上传文件到Ragflow失败: %s", e)
+        return OrjsonResponse(content={"success": False, "message": f"上传失败: {str(e)}"})
 
 # API: 向Ragflow查询
 @app.post("/api/ragflow/query")
 async def query_ragflow(request: Request):
     try:
-        data = await request.json()
+        data = await read_json(request)
         question = data.get("question", "")
         top_k = data.get("top_k", 3)
         
         if not question:
-            return JSONResponse(content={"success": False, "message": "没有提供查询问题"})
+            return OrjsonResponse(content={"success": False, "message": "没有提供查询问题"})
         
-        config = load_config()
+        config = get_cached_config()
         ragflow_url = config.get("ragflow_url", "")
         ragflow_api_key = config.get("ragflow_api_key", "")
         ragflow_dataset_id = config.get("ragflow_dataset_id")
         
         if not ragflow_url or not ragflow_api_key:
-            return JSONResponse(content={"success": False, "message": "Ragflow URL或API Key未配置"})
+            return OrjsonResponse(content={"success": False, "message": "Ragflow URL或API Key未配置"})
         
         if not ragflow_dataset_id:
-            return JSONResponse(content={"success": False, "message": "Ragflow数据集ID未配置"})
+            return OrjsonResponse(content={"success": False, "message": "Ragflow数据集ID未配置"})
         
-        client = RagflowClient(ragflow_url, ragflow_api_key, ragflow_dataset_id)
-        result = client.query(question, top_k=top_k)
+        client = get_ragflow_client(ragflow_url, ragflow_api_key, ragflow_dataset_id)
+        result = await client.query(question, top_k=top_k)
         
-        return JSONResponse(content={"success": True, "result": result})
+        return OrjsonResponse(content={"success": True, "result": result})
     except Exception as e:
-        logger.error(f"向Ragflow查询失败: {str(e)}")
-        return JSONResponse(content={"success": False, "message": f"查询失败: {str(e)}"})
+        logger.error("向Ragflow查询失败: %s", e)
+        return OrjsonResponse(content={"success": False, "message": f"查询失败: {str(e)}"})
 
 # API: 获取Ragflow数据集列表
 @app.get("/api/ragflow/datasets")
 async def get_ragflow_datasets():
-    config = load_config()
+    config = get_cached_config()
     ragflow_url = config.get("ragflow_url", "")
     ragflow_api_key = config.get("ragflow_api_key", "")
     
     if not ragflow_url or not ragflow_api_key:
-        return JSONResponse(content={"success": False, "message": "Ragflow URL或API Key未配置"})
+        return OrjsonResponse(content={"success": False, "message": "Ragflow URL或API Key未配置"})
     
-    client = RagflowClient(ragflow_url, ragflow_api_key)
-    datasets = client.get_datasets()
+    client = get_ragflow_client(ragflow_url, ragflow_api_key)
+    datasets = await client.get_datasets()
     
-    return JSONResponse(content={"success": True, "datasets": datasets})
+    return OrjsonResponse(content={"success": True, "datasets": datasets})
+
+# 工单图片的浏览器缓存时间（秒）
+IMAGE_CACHE_CONTROL = "public, max-age=3600"
 
 # API: 获取图片文件
 @app.get("/api/images/{file_path:path}")
-async def get_image(file_path: str):
-    # 获取配置中的输出目录
-    config = load_config()
-    output_dir = config.get("output_directory", os.path.join(os.path.expanduser("~"), "outlook_tickets"))
-    
-    # 构建完整的图片路径
-    image_path = os.path.join(output_dir, file_path)
+async def get_image(file_path: str, request: Request):
+    # 构建完整的图片路径，解析后必须仍位于输出目录内，防止通过../访问其他文件
+    output_root = get_output_root()
+    image_path = (output_root / file_path).resolve()
+    if not image_path.is_relative_to(output_root):
+        raise HTTPException(status_code=404, detail="图片文件未找到")
     
-    if os.path.exists(image_path) and os.path.isfile(image_path):
-        return FileResponse(image_path)
-    else:
+    # 一次stat同时判断文件是否存在、是否为普通文件，并用于生成ETag
+    try:
+        st = image_path.stat()
+    except OSError:
+        st = None
+    if st is None or not stat.S_ISREG(st.st_mode):
         raise HTTPException(status_code=404, detail="图片文件未找到")
+    
+    etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    headers = {"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL}
+    
+    # 浏览器缓存的图片未变化时直接返回304，不再读取文件
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    return FileResponse(image_path, headers=headers, stat_result=st)
 
 # 运行应用
 if __name__ == "__main__":
@@ -370,13 +537,17 @@ if __name__ == "__main__":
     host = get_config_value("web_host", "0.0.0.0")
     port = get_config_value("web_port", 8000)
     
-    # 如果是从应用模式，自动启动同步循环
-    if app_mode == "slave" and slave_sync:
-        asyncio.create_task(slave_sync.start_sync_loop())
+    # 工作进程数：主/从同步状态保存在进程内存中，多进程时各进程互不共享，默认使用单进程
+    workers = int(os.environ.get("WEB_WORKERS", "1"))
     
+    # loop/http为auto时，已安装uvloop和httptools就自动使用它们（uvloop不支持Windows，
+    # 此时退回标准asyncio事件循环）；只在开发模式下开启代码热重载
     uvicorn.run(
         "app.web.main:app",
         host=host,
         port=port,
-        reload=True
+        loop="auto",
+        http="auto",
+        workers=workers,
+        reload=DEV_MODE
     )
\ No newline at end of file